@@ -0,0 +1,84 @@
+"""
+About
+
+Compare the latency of typical tracking store operations using different
+database drivers, for example CrateDB's HTTP interface and its PostgreSQL
+wire protocol.
+
+Usage
+
+    python examples/benchmark_drivers.py \
+        "crate://crate@localhost:4200/?schema=benchmark" \
+        "crate+psycopg://crate@localhost:5432/?schema=benchmark&prepare_threshold=2"
+"""
+
+import logging
+import statistics
+import sys
+import tempfile
+import time
+import typing as t
+
+logger = logging.getLogger()
+
+ROUNDS = 50
+BATCH_SIZE = 100
+
+
+def measure(operation: t.Callable[[], t.Any]) -> float:
+    start = time.perf_counter()
+    operation()
+    return (time.perf_counter() - start) * 1000
+
+
+def benchmark(db_uri: str) -> t.Dict[str, t.List[float]]:
+    """
+    Log metrics and parameters of a run, and read them back, recording latencies in milliseconds.
+    """
+    from mlflow.entities import Metric, Param
+    from mlflow.store.tracking.sqlalchemy_store import SqlAlchemyStore
+
+    store = SqlAlchemyStore(db_uri, tempfile.mkdtemp())
+    experiment_id = store.create_experiment(f"benchmark-{time.time_ns()}")
+    run_id = store.create_run(experiment_id, user_id="benchmark", start_time=0, tags=[], run_name="run").info.run_id
+
+    timings: t.Dict[str, t.List[float]] = {"log_batch": [], "get_run": [], "get_metric_history": []}
+    for step in range(ROUNDS):
+        metrics = [Metric(f"metric-{i}", float(i), step, step) for i in range(BATCH_SIZE)]
+        params = [Param(f"param-{step}", str(step))]
+        timings["log_batch"].append(measure(lambda: store.log_batch(run_id, metrics, params, [])))  # noqa: B023
+        timings["get_run"].append(measure(lambda: store.get_run(run_id)))
+        timings["get_metric_history"].append(measure(lambda: store.get_metric_history(run_id, "metric-0")))
+    return timings
+
+
+def report(db_uri: str, timings: t.Dict[str, t.List[float]]):
+    logger.info(f"Driver: {db_uri.split('://')[0]}")
+    for operation, values in timings.items():
+        logger.info(
+            f"  {operation:<20} median={statistics.median(values):8.2f}ms  "
+            f"p95={statistics.quantiles(values, n=20)[-1]:8.2f}ms"
+        )
+
+
+def start_adapter():
+    logger.info("Initializing CrateDB adapter")
+    import mlflow_cratedb  # noqa: F401
+
+
+def setup_logging():
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+def main():
+    """
+    Benchmark all database URIs given on the command line.
+    """
+    setup_logging()
+    start_adapter()
+    for db_uri in sys.argv[1:]:
+        report(db_uri, benchmark(db_uri))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Run the tracking store on the event loop of the FastAPI server, without blocking threads.
+
+MLflow's FastAPI application serves its REST API through the mounted Flask application,
+so each request occupies a worker thread while it waits for the database. When using the
+`crate+psycopg://` dialect, the adapter serves the endpoints used by logging clients
+natively instead, see `mlflow_cratedb.patch.mlflow.fastapi_app`.
+
+The methods of MLflow's `SqlAlchemyStore` run unchanged within greenlets, like SQLAlchemy's
+asyncio extension does for `run_sync()`, while their database I/O is awaited on the event
+loop, using psycopg's asynchronous connections of the `crate+psycopg_async://` dialect.
+Requests waiting for the database do not occupy threads, and the number of concurrent
+queries is bounded by the connection pool, sized by `MLFLOW_SQLALCHEMYSTORE_POOL_SIZE`.
+"""
+
+import copy
+import typing as t
+
+import sqlalchemy as sa
+
+if t.TYPE_CHECKING:
+    from mlflow.entities import Metric, Param, Run, RunTag, TraceInfo
+    from mlflow.store.entities.paged_list import PagedList
+    from mlflow.store.tracking.sqlalchemy_store import SqlAlchemyStore
+
+# Asynchronous variants of database drivers.
+ASYNC_DRIVERS = {"crate+psycopg": "crate+psycopg_async"}
+
+
+def supports_async(db_uri: t.Optional[str]) -> bool:
+    """
+    Whether the driver of a database URI has an asynchronous variant.
+    """
+    return bool(db_uri) and str(db_uri).partition("://")[0].lower() in ASYNC_DRIVERS
+
+
+def async_db_uri(db_uri: str) -> str:
+    """
+    Return the database URI using the asynchronous variant of its driver.
+    """
+    scheme, separator, rest = db_uri.partition("://")
+    if scheme.lower() not in ASYNC_DRIVERS:
+        raise ValueError(f"Asynchronous database access needs the `crate+psycopg://` dialect, not `{scheme}://`")
+    return f"{ASYNC_DRIVERS[scheme.lower()]}{separator}{rest}"
+
+
+class AsyncTrackingStore:
+    """
+    Asynchronous variant of a CrateDB-backed tracking store, sharing its state.
+    """
+
+    def __init__(self, store: "SqlAlchemyStore"):
+        import mlflow.store.db.utils as db_utils
+        from sqlalchemy.orm import sessionmaker
+
+        self.engine: sa.Engine = db_utils.create_sqlalchemy_engine(async_db_uri(store.db_uri))
+        self.store = copy.copy(store)
+        self.store.engine = self.engine
+        self.store.ManagedSessionMaker = db_utils._get_managed_session_maker(
+            sessionmaker(bind=self.engine), store.db_type
+        )
+
+    async def run_sync(self, fn: t.Callable[..., t.Any], *args, **kwargs) -> t.Any:
+        """
+        Invoke a synchronous function using the store's engine, awaiting its database I/O on the event loop.
+        """
+        from sqlalchemy.util import greenlet_spawn
+
+        return await greenlet_spawn(fn, *args, **kwargs)
+
+    async def log_batch(
+        self, run_id: str, metrics: t.List["Metric"], params: t.List["Param"], tags: t.List["RunTag"]
+    ) -> None:
+        await self.run_sync(self.store.log_batch, run_id=run_id, metrics=metrics, params=params, tags=tags)
+
+    async def get_run(self, run_id: str) -> "Run":
+        return await self.run_sync(self.store.get_run, run_id)
+
+    async def search_runs(
+        self,
+        experiment_ids: t.List[str],
+        filter_string: str,
+        run_view_type: int,
+        max_results: int,
+        order_by: t.List[str],
+        page_token: t.Optional[str],
+    ) -> "PagedList[Run]":
+        return await self.run_sync(
+            self.store.search_runs,
+            experiment_ids=experiment_ids,
+            filter_string=filter_string,
+            run_view_type=run_view_type,
+            max_results=max_results,
+            order_by=order_by,
+            page_token=page_token,
+        )
+
+    async def get_metric_history(
+        self, run_id: str, metric_key: str, max_results: t.Optional[int] = None, page_token: t.Optional[str] = None
+    ) -> "PagedList[Metric]":
+        return await self.run_sync(
+            self.store.get_metric_history, run_id, metric_key, max_results=max_results, page_token=page_token
+        )
+
+    async def start_trace(self, trace_info: "TraceInfo") -> "TraceInfo":
+        return await self.run_sync(self.store.start_trace, trace_info)
+
+    async def get_trace_info(self, trace_id: str) -> "TraceInfo":
+        return await self.run_sync(self.store.get_trace_info, trace_id)
+
+    async def search_traces(
+        self,
+        locations: t.List[str],
+        filter_string: t.Optional[str],
+        max_results: int,
+        order_by: t.List[str],
+        page_token: t.Optional[str],
+    ) -> t.Tuple[t.List["TraceInfo"], t.Optional[str]]:
+        return await self.run_sync(
+            self.store.search_traces,
+            locations=locations,
+            filter_string=filter_string,
+            max_results=max_results,
+            order_by=order_by,
+            page_token=page_token,
+        )
+
+    async def set_trace_tag(self, trace_id: str, key: str, value: str) -> None:
+        await self.run_sync(self.store.set_trace_tag, trace_id, key, value)
+
+    async def delete_trace_tag(self, trace_id: str, key: str) -> None:
+        await self.run_sync(self.store.delete_trace_tag, trace_id, key)
@@ -0,0 +1,213 @@
+"""
+Spread database connections across multiple CrateDB nodes, and route around dead nodes.
+
+A `crate://` URI can list multiple hosts, like libpq does for PostgreSQL:
+
+    crate://crate@node1:4200,node2:4200,node3:4200/?schema=mlflow
+
+Each new connection is given a single node, the next one in round-robin order, because
+session settings like `search_path` are bound to the HTTP session of one node, see
+`mlflow_cratedb.adapter.session`. When its node does not respond, the connection is
+invalidated, and the pool replaces it by a connection to the next node, applying the
+session settings again. A background thread probes all nodes periodically, so new
+connections are only given nodes which are alive, and requests of training jobs do
+not run into timeouts of dead nodes. When no node responds to probes, all nodes take
+turns, and the driver reports the connection error.
+
+The probe interval is configured using the `probe_interval_ms` query parameter.
+Probes of HTTPS nodes verify certificates like the driver does, according to the
+`sslmode`, `verify_ssl_cert`, `ca_cert`, `client_cert`, and `client_key` query parameters.
+"""
+
+import logging
+import os
+import re
+import ssl as ssl_module
+import threading
+import typing as t
+import weakref
+
+import sqlalchemy as sa
+
+logger = logging.getLogger(__name__)
+
+# Query parameters of `crate://` URIs which are consumed by the adapter, not by the database driver.
+URI_PARAMETERS = ("probe_interval_ms",)
+
+DEFAULT_PORT = 4200
+DEFAULT_PROBE_INTERVAL_MS = 5_000
+
+# Responses indicating a node is unavailable, matching the CrateDB driver.
+UNAVAILABLE_STATUSES = (502, 503, 504, 509)
+
+_URI_PATTERN = re.compile(r"^(?P<scheme>[\w+]+://)(?P<userinfo>[^@/?]*@)?(?P<hosts>[^/?]*)(?P<rest>.*)$")
+
+
+def split_servers(db_uri: str) -> t.Tuple[str, t.List[str]]:
+    """
+    Split a database URI listing multiple hosts into a URI using the first host only,
+    and the list of all servers as `host:port`. Return an empty list for single hosts.
+    """
+    match = _URI_PATTERN.match(db_uri)
+    if not match or "," not in match.group("hosts"):
+        return db_uri, []
+    hosts = [host.strip() for host in match.group("hosts").split(",") if host.strip()]
+    servers = [host if ":" in host else f"{host}:{DEFAULT_PORT}" for host in hosts]
+    return f"{match.group('scheme')}{match.group('userinfo') or ''}{servers[0]}{match.group('rest')}", servers
+
+
+def join_servers(db_uri: str, servers: t.List[str]) -> str:
+    """
+    Render a database URI listing all given servers, the inverse of `split_servers`.
+    """
+    match = _URI_PATTERN.match(db_uri)
+    if not match or not servers:
+        return db_uri
+    return f"{match.group('scheme')}{match.group('userinfo') or ''}{','.join(servers)}{match.group('rest')}"
+
+
+def use_ssl(url: sa.URL) -> bool:
+    """
+    Whether the driver connects using HTTPS, according to the `ssl` or `sslmode` query parameters.
+    """
+    if str(url.query.get("ssl", "")).lower() in ("true", "1", "yes"):
+        return True
+    return str(url.query.get("sslmode", "")).lower() in ("require", "verify-ca", "verify-full")
+
+
+def ssl_options(url: sa.URL) -> t.Dict[str, t.Any]:
+    """
+    Return the TLS options of urllib3 matching the driver, which verifies certificates by default,
+    unless `sslmode` is `allow`, `prefer`, or `require`, or `verify_ssl_cert` is false.
+    """
+    sslmode = str(url.query.get("sslmode", "")).lower()
+    if sslmode in ("verify-ca", "verify-full"):
+        verify = True
+    elif sslmode in ("allow", "prefer", "require"):
+        verify = False
+    else:
+        verify = str(url.query.get("verify_ssl_cert", "true")).lower() not in ("false", "0", "no")
+    options: t.Dict[str, t.Any] = {"cert_reqs": ssl_module.CERT_REQUIRED if verify else ssl_module.CERT_NONE}
+    ca_cert = url.query.get("ca_cert") or os.environ.get("REQUESTS_CA_BUNDLE")
+    if ca_cert:
+        options["ca_certs"] = str(ca_cert)
+    for parameter, option in (("client_cert", "cert_file"), ("client_key", "key_file")):
+        if url.query.get(parameter):
+            options[option] = str(url.query[parameter])
+    return options
+
+
+class ClusterNodes:
+    """
+    Background service probing the nodes of a cluster, and tracking which of them are alive.
+    """
+
+    def __init__(
+        self,
+        servers: t.List[str],
+        ssl: bool = False,
+        probe_interval_ms: int = DEFAULT_PROBE_INTERVAL_MS,
+        tls: t.Optional[t.Dict[str, t.Any]] = None,
+    ):
+        import urllib3
+
+        self.servers = list(servers)
+        self.scheme = "https" if ssl else "http"
+        self.interval = probe_interval_ms / 1000
+        self._alive: t.List[str] = list(servers)
+        self._offset = 0
+        self._lock = threading.Lock()
+        self._closing = threading.Event()
+        self._thread: t.Optional[threading.Thread] = None
+        timeout = urllib3.Timeout(connect=min(self.interval, 2.0), read=min(self.interval, 2.0))
+        self._http = urllib3.PoolManager(timeout=timeout, retries=False, **(tls or {}))
+
+    def alive(self) -> t.List[str]:
+        """
+        Return the servers which responded to the most recent probe, or all servers, when none did.
+        """
+        with self._lock:
+            return list(self._alive or self.servers)
+
+    def rotation(self) -> t.List[str]:
+        """
+        Return the servers which are alive, starting with the next one in round-robin order.
+        """
+        servers = self.alive()
+        with self._lock:
+            offset = self._offset % len(servers)
+            self._offset += 1
+        return servers[offset:] + servers[:offset]
+
+    def probe(self, server: str) -> bool:
+        """
+        Whether a node responds to HTTP requests. Any response, even unauthorized, counts as alive.
+        """
+        try:
+            response = self._http.request("GET", f"{self.scheme}://{server}/", preload_content=True)
+        except Exception as ex:
+            logger.debug(f"Probing CrateDB node {server} failed: {ex}")
+            return False
+        return response.status not in UNAVAILABLE_STATUSES
+
+    def probe_all(self):
+        alive = [server for server in self.servers if self.probe(server)]
+        with self._lock:
+            for server in set(self._alive) - set(alive):
+                logger.warning(f"Removed CrateDB node {server} from rotation")
+            for server in set(alive) - set(self._alive):
+                logger.info(f"Restored CrateDB node {server} into rotation")
+            self._alive = alive
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="cratedb-probe", daemon=True)
+                self._thread.start()
+
+    def close(self):
+        self._closing.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._closing.wait(self.interval):
+            self.probe_all()
+
+    def receive_do_connect(self, dialect, conn_rec, cargs, cparams):
+        """
+        Give a new DBAPI connection the next node which is alive, see the `do_connect` dialect event.
+        """
+        cparams["servers"] = self.rotation()[:1]
+        cparams.pop("host", None)
+        cparams.pop("port", None)
+
+    def receive_handle_error(self, context: sa.engine.ExceptionContext):
+        """
+        Invalidate connections whose node does not respond, so the pool replaces them by
+        connections to other nodes, see the `handle_error` engine event.
+        """
+        from crate.client.exceptions import ConnectionError as CrateConnectionError
+
+        if isinstance(context.original_exception, CrateConnectionError):
+            context.is_disconnect = True
+
+
+_nodes: "weakref.WeakKeyDictionary[sa.Engine, ClusterNodes]" = weakref.WeakKeyDictionary()
+
+
+def enable_load_balancing(engine: sa.Engine, servers: t.List[str], probe_interval_ms: int):
+    """
+    Spread connections of an engine across multiple servers, probing them in the background.
+    """
+    nodes = ClusterNodes(
+        servers, ssl=use_ssl(engine.url), probe_interval_ms=probe_interval_ms, tls=ssl_options(engine.url)
+    )
+    _nodes[engine] = nodes
+    sa.event.listen(engine, "do_connect", nodes.receive_do_connect)
+    sa.event.listen(engine, "handle_error", nodes.receive_handle_error)
+    nodes.start()
+
+
+def get_cluster_nodes(engine: sa.Engine) -> t.Optional[ClusterNodes]:
+    return _nodes.get(engine)
@@ -532,3 +532,10 @@ CREATE TABLE IF NOT EXISTS "workspaces" (
 	default_artifact_root TEXT,
 	PRIMARY KEY (name)
 );
+
+-- Metadata of the MLflow adapter for CrateDB, not part of MLflow.
+CREATE TABLE IF NOT EXISTS "adapter_metadata" (
+	key TEXT NOT NULL,
+	value TEXT,
+	PRIMARY KEY (key)
+);
@@ -1,3 +1,4 @@
+DROP TABLE IF EXISTS "adapter_metadata";
 DROP TABLE IF EXISTS "assessments";
 DROP TABLE IF EXISTS "budget_policies";
 DROP TABLE IF EXISTS "datasets";
@@ -41,6 +42,7 @@ DROP TABLE IF EXISTS "trace_info";
 DROP TABLE IF EXISTS "trace_metrics";
 DROP TABLE IF EXISTS "trace_request_metadata";
 DROP TABLE IF EXISTS "trace_tags";
+DROP TABLE IF EXISTS "unique_keys";
 DROP TABLE IF EXISTS "webhooks";
 DROP TABLE IF EXISTS "webhook_events";
 DROP TABLE IF EXISTS "workspaces";
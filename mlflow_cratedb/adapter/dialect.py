@@ -0,0 +1,223 @@
+"""
+Connect to CrateDB using its PostgreSQL wire protocol, through the psycopg driver.
+
+The `crate+psycopg://` dialect reuses the SQL compiler and types of the `crate://`
+dialect, but talks to CrateDB's PostgreSQL interface on port 5432. Its reflection
+queries use bound parameters, rendered in the `pyformat` style of psycopg, instead
+of the `qmark` style of the HTTP driver. psycopg
+uses the extended query protocol, and prepares statements on the server after they
+have been executed `prepare_threshold` times on the same connection, so hot queries
+of the tracking store are not parsed again. Results can optionally be transferred in
+binary format, using the `binary` query parameter.
+
+Example URI: `crate+psycopg://crate@localhost:5432/?schema=mlflow&prepare_threshold=2`
+
+The `crate+psycopg_async://` dialect uses psycopg's asynchronous connections, for use
+with SQLAlchemy's asyncio extension, see `mlflow_cratedb.adapter.async_store`.
+
+Install the driver using `pip install 'mlflow-cratedb[postgresql]'`.
+"""
+
+import datetime as dt
+import json
+import typing as t
+
+import sqlalchemy as sa
+from sqlalchemy.engine import default, reflection
+from sqlalchemy.sql import sqltypes
+from sqlalchemy_cratedb.dialect import CrateDialect, Date, DateTime
+
+DEFAULT_PORT = 5432
+
+# Query parameters of `crate+psycopg://` URIs which are consumed by the dialect.
+URI_PARAMETERS = ("prepare_threshold", "binary", "sslmode", "connect_timeout", "application_name")
+
+
+class PsycopgDate(Date):
+    """
+    psycopg decodes dates itself, while the HTTP interface returns epoch milliseconds.
+    """
+
+    def result_processor(self, dialect, coltype):
+        process = super().result_processor(dialect, coltype)
+
+        def process_date(value):
+            if isinstance(value, dt.datetime):
+                return value.date()
+            if isinstance(value, dt.date):
+                return value
+            return process(value)
+
+        return process_date
+
+
+class PsycopgDateTime(DateTime):
+    """
+    psycopg decodes timestamps itself, while the HTTP interface returns epoch milliseconds.
+    """
+
+    def result_processor(self, dialect, coltype):
+        process = super().result_processor(dialect, coltype)
+
+        def process_datetime(value):
+            if isinstance(value, dt.datetime):
+                return value.astimezone(dt.timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+            return process(value)
+
+        return process_datetime
+
+
+class CratePsycopgExecutionContext(default.DefaultExecutionContext):
+    def create_default_cursor(self):
+        # The cursors of asynchronous connections do not support binary results.
+        if getattr(self.dialect, "binary", False) and not self.dialect.is_async:
+            return self._dbapi_connection.cursor(binary=True)
+        return self._dbapi_connection.cursor()
+
+
+class CratePsycopgDialect(CrateDialect):
+    """
+    CrateDB dialect using psycopg over the PostgreSQL wire protocol.
+    """
+
+    driver = "psycopg"
+    default_paramstyle = "pyformat"
+    execution_ctx_cls = CratePsycopgExecutionContext
+    supports_statement_cache = True
+    colspecs = {
+        sqltypes.Date: PsycopgDate,
+        sqltypes.DateTime: PsycopgDateTime,
+        sqltypes.TIMESTAMP: PsycopgDateTime,
+    }
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.binary = False
+
+        # psycopg does not adapt dictionaries, so `OBJECT` values are sent as JSON text,
+        # which CrateDB casts implicitly. They are returned as JSON, decoded by psycopg.
+        self._json_serializer = json.dumps
+
+    @classmethod
+    def import_dbapi(cls):
+        try:
+            import psycopg
+        except ImportError as ex:
+            raise ImportError(
+                "The `crate+psycopg://` dialect needs the psycopg driver. "
+                "Install it using `pip install 'mlflow-cratedb[postgresql]'`"
+            ) from ex
+        return psycopg
+
+    @classmethod
+    def dbapi(cls):
+        return cls.import_dbapi()
+
+    def create_connect_args(self, url: sa.URL) -> t.Tuple[t.List[t.Any], t.Dict[str, t.Any]]:
+        """
+        Derive psycopg connection parameters. The `schema` query parameter is not a connection
+        parameter, it is applied using `search_path`, see `mlflow_cratedb.adapter.session`.
+        """
+        cparams: t.Dict[str, t.Any] = {
+            "host": url.host or "localhost",
+            "port": url.port or DEFAULT_PORT,
+            "user": url.username or "crate",
+            "dbname": url.database or "crate",
+            "autocommit": True,
+        }
+        if url.password:
+            cparams["password"] = url.password
+        for name in URI_PARAMETERS:
+            value = url.query.get(name)
+            if value is None or name == "binary":
+                continue
+            cparams[name] = int(str(value)) if name in ("prepare_threshold", "connect_timeout") else value
+        return [], cparams
+
+    def connect(self, *cargs, **cparams):
+        return self.loaded_dbapi.connect(*cargs, **cparams)
+
+    def _get_server_version_info(self, connection):
+        version = connection.exec_driver_sql("SELECT MIN(version['number']) FROM sys.nodes").scalar()
+        return tuple(int(part) for part in str(version).split("-")[0].split(".") if part.isdigit())
+
+    @staticmethod
+    def _schema_clause(schema: t.Optional[str]) -> str:
+        """
+        Restrict a reflection query to a schema, or to the current schema, which follows `search_path`.
+        """
+        return "table_schema = CURRENT_SCHEMA" if schema is None else "table_schema = :schema"
+
+    @reflection.cache
+    def get_schema_names(self, connection, **kw):
+        sql = "SELECT schema_name FROM information_schema.schemata ORDER BY schema_name"
+        return list(connection.execute(sa.text(sql)).scalars())
+
+    @reflection.cache
+    def get_table_names(self, connection, schema=None, **kw):
+        sql = (
+            "SELECT table_name FROM information_schema.tables "  # noqa: S608
+            f"WHERE {self._schema_clause(schema)} AND table_type = 'BASE TABLE' ORDER BY table_name"
+        )
+        return list(connection.execute(sa.text(sql), {"schema": schema}).scalars())
+
+    @reflection.cache
+    def get_view_names(self, connection, schema=None, **kw):
+        sql = f"SELECT table_name FROM information_schema.views WHERE {self._schema_clause(schema)} ORDER BY table_name"  # noqa: S608
+        return list(connection.execute(sa.text(sql), {"schema": schema}).scalars())
+
+    @reflection.cache
+    def get_columns(self, connection, table_name, schema=None, **kw):
+        # Skip the subscripts of object columns, like `status_details['message']`.
+        sql = (
+            "SELECT column_name, data_type FROM information_schema.columns "  # noqa: S608
+            f"WHERE table_name = :table AND {self._schema_clause(schema)} AND column_name NOT LIKE '%[%' "
+            "ORDER BY ordinal_position"
+        )
+        result = connection.execute(sa.text(sql), {"table": table_name, "schema": schema})
+        return [self._create_column_info(row) for row in result]
+
+    @reflection.cache
+    def get_pk_constraint(self, connection, table_name, schema=None, **kw):
+        sql = (
+            "SELECT column_name FROM information_schema.key_column_usage "  # noqa: S608
+            f"WHERE table_name = :table AND {self._schema_clause(schema)}"
+        )
+        columns = connection.execute(sa.text(sql), {"table": table_name, "schema": schema}).scalars()
+        return {"constrained_columns": sorted(columns), "name": "PRIMARY KEY"}
+
+    @classmethod
+    def engine_created(cls, engine: sa.Engine):
+        """
+        Transfer results in binary format, when enabled using the `binary` query parameter.
+        """
+        binary = str(engine.url.query.get("binary", "")).lower() in ("true", "1", "yes")
+        engine.dialect.binary = binary  # type: ignore[attr-defined]
+
+
+class CratePsycopgAsyncDialect(CratePsycopgDialect):
+    """
+    CrateDB dialect using psycopg's asynchronous connections over the PostgreSQL wire protocol.
+    """
+
+    driver = "psycopg_async"
+    is_async = True
+    supports_statement_cache = True
+
+    @classmethod
+    def import_dbapi(cls):
+        from sqlalchemy.dialects.postgresql.psycopg import PGDialectAsync_psycopg
+
+        super().import_dbapi()
+        return PGDialectAsync_psycopg.import_dbapi()
+
+    def get_driver_connection(self, connection):
+        return connection._connection
+
+
+def register_dialect():
+    """
+    Make the `crate+psycopg://` and `crate+psycopg_async://` dialects available to SQLAlchemy.
+    """
+    sa.dialects.registry.register("crate.psycopg", "mlflow_cratedb.adapter.dialect", "CratePsycopgDialect")
+    sa.dialects.registry.register("crate.psycopg_async", "mlflow_cratedb.adapter.dialect", "CratePsycopgAsyncDialect")
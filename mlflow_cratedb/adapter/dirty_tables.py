@@ -0,0 +1,245 @@
+"""
+Track tables which have been modified but not refreshed yet, per database.
+
+Each mark records a new generation number, so a table is only considered
+clean again when no other write has been recorded while refreshing it.
+"""
+
+import functools
+import hashlib
+import itertools
+import logging
+import mmap
+import os
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import typing as t
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class DirtyTableRegistry:
+    """
+    Registry of dirty tables, shared by all connections of the current process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counter = itertools.count(1)
+        self._generations: t.Dict[t.Tuple[str, str], int] = {}
+
+    def mark(self, database: str, tables: t.Iterable[str]):
+        with self._lock:
+            for table in tables:
+                self._generations[(database, table)] = next(self._counter)
+
+    def dirty(self, database: str, tables: t.Iterable[str]) -> t.Dict[str, int]:
+        if not self._generations:
+            return {}
+        with self._lock:
+            return {
+                table: generation
+                for table in tables
+                if (generation := self._generations.get((database, table))) is not None
+            }
+
+    def clean(self, database: str, generations: t.Dict[str, int]):
+        with self._lock:
+            for table, generation in generations.items():
+                if self._generations.get((database, table)) == generation:
+                    del self._generations[(database, table)]
+
+
+class SharedDirtyTableRegistry:
+    """
+    Registry of dirty tables, shared by all processes on the same host, for example
+    multiple uvicorn workers of the MLflow server, or huey consumers.
+
+    Each database uses a small memory-mapped file within a private directory of the
+    current user, guarded by an advisory file lock. The file holds a generation counter,
+    the number of dirty tables, and a fixed number of slots, each storing a table name
+    and its generation, where zero means clean. When the file can not be used safely,
+    the registry falls back to process scope for that database.
+    """
+
+    HEADER = struct.Struct("<qq")
+    SLOT = struct.Struct("<64sq")
+    SLOTS = 256
+
+    def __init__(self, directory: t.Optional[str] = None):
+        self.directory = directory or default_directory()
+        self._files: t.Dict[str, t.Tuple[int, t.IO[bytes], mmap.mmap]] = {}
+        self._lock = threading.Lock()
+        self._fallback = DirtyTableRegistry()
+        self._unavailable: t.Set[str] = set()
+
+    def path(self, database: str) -> str:
+        digest = hashlib.sha1(database.encode("utf-8"), usedforsecurity=False).hexdigest()[:16]
+        return os.path.join(self.directory, f"mlflow-cratedb-{digest}.dirty")
+
+    def _open(self, database: str) -> t.Optional[t.Tuple[t.IO[bytes], mmap.mmap]]:
+        """
+        Open the memory-mapped file of a database, and re-open it after forking,
+        because advisory locks are shared between file descriptors inherited by children.
+        Return nothing when the file can not be used safely.
+        """
+        pid = os.getpid()
+        with self._lock:
+            if database in self._unavailable:
+                return None
+            entry = self._files.get(database)
+            if entry is None or entry[0] != pid:
+                try:
+                    entry = (pid, *self._open_file(database))
+                except OSError as ex:
+                    logger.warning(
+                        f"Shared registry of dirty tables is not available, using process scope. Reason: {ex}"
+                    )
+                    self._unavailable.add(database)
+                    return None
+                self._files[database] = entry
+            return entry[1], entry[2]
+
+    def _open_file(self, database: str) -> t.Tuple[t.IO[bytes], mmap.mmap]:
+        """
+        Open the file of a database, refusing symbolic links, and files of other users.
+        """
+        verify_private_directory(self.directory)
+        size = self.HEADER.size + self.SLOTS * self.SLOT.size
+        fd = os.open(self.path(database), os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        try:
+            status = os.fstat(fd)
+            if not stat.S_ISREG(status.st_mode) or status.st_uid != os.getuid():
+                raise PermissionError(f"Not a regular file of the current user: {self.path(database)}")
+            if status.st_size < size:
+                os.ftruncate(fd, size)
+            file = os.fdopen(fd, "r+b")
+        except BaseException:
+            os.close(fd)
+            raise
+        return file, mmap.mmap(file.fileno(), size)
+
+    @contextmanager
+    def _locked(self, file: t.IO[bytes], buffer: mmap.mmap, exclusive: bool = True):
+        import fcntl
+
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield buffer
+        finally:
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+    @staticmethod
+    def _name(table: str) -> bytes:
+        name = table.encode("utf-8")
+        if len(name) > 64:
+            name = hashlib.sha1(name, usedforsecurity=False).hexdigest().encode("ascii")
+        return name.ljust(64, b"\0")
+
+    def _find(self, buffer: mmap.mmap, name: bytes, allocate: bool = False) -> t.Optional[int]:
+        """
+        Return the offset of the slot for a table name, using open addressing with linear probing.
+        """
+        start = int.from_bytes(hashlib.sha1(name, usedforsecurity=False).digest()[:4], "little")
+        for probe in range(self.SLOTS):
+            offset = self.HEADER.size + ((start + probe) % self.SLOTS) * self.SLOT.size
+            slot_name, _ = self.SLOT.unpack_from(buffer, offset)
+            if slot_name == name:
+                return offset
+            if slot_name == b"\0" * 64:
+                if allocate:
+                    self.SLOT.pack_into(buffer, offset, name, 0)
+                    return offset
+                return None
+        raise RuntimeError("Shared registry of dirty tables is full")
+
+    def mark(self, database: str, tables: t.Iterable[str]):
+        opened = self._open(database)
+        if opened is None:
+            self._fallback.mark(database, tables)
+            return
+        with self._locked(*opened) as buffer:
+            counter, dirty = self.HEADER.unpack_from(buffer)
+            for table in tables:
+                offset = t.cast(int, self._find(buffer, self._name(table), allocate=True))
+                name, generation = self.SLOT.unpack_from(buffer, offset)
+                counter += 1
+                if not generation:
+                    dirty += 1
+                self.SLOT.pack_into(buffer, offset, name, counter)
+            self.HEADER.pack_into(buffer, 0, counter, dirty)
+
+    def dirty(self, database: str, tables: t.Iterable[str]) -> t.Dict[str, int]:
+        opened = self._open(database)
+        if opened is None:
+            return self._fallback.dirty(database, tables)
+        generations: t.Dict[str, int] = {}
+        # Peek at the number of dirty tables without locking, to keep the common case cheap.
+        if not self.HEADER.unpack_from(opened[1])[1]:
+            return generations
+        with self._locked(*opened, exclusive=False) as buffer:
+            for table in tables:
+                offset = self._find(buffer, self._name(table))
+                if offset is not None and (generation := self.SLOT.unpack_from(buffer, offset)[1]):
+                    generations[table] = generation
+        return generations
+
+    def clean(self, database: str, generations: t.Dict[str, int]):
+        opened = self._open(database)
+        if opened is None:
+            self._fallback.clean(database, generations)
+            return
+        with self._locked(*opened) as buffer:
+            counter, dirty = self.HEADER.unpack_from(buffer)
+            for table, generation in generations.items():
+                offset = self._find(buffer, self._name(table))
+                if offset is not None and self.SLOT.unpack_from(buffer, offset)[1] == generation:
+                    self.SLOT.pack_into(buffer, offset, self._name(table), 0)
+                    dirty -= 1
+            self.HEADER.pack_into(buffer, 0, counter, dirty)
+
+
+def default_directory() -> str:
+    """
+    Return the private runtime directory of the current user, or a directory
+    within the temporary directory, named after the current user.
+    """
+    runtime_directory = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_directory and os.path.isdir(runtime_directory):
+        return os.path.join(runtime_directory, "mlflow-cratedb")
+    return os.path.join(tempfile.gettempdir(), f"mlflow-cratedb-{os.getuid()}")
+
+
+def verify_private_directory(directory: str):
+    """
+    Create a directory only accessible by the current user, or verify an existing one is.
+    """
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    status = os.lstat(directory)
+    if not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid() or status.st_mode & 0o077:
+        raise PermissionError(f"Not a private directory of the current user: {directory}")
+
+
+@functools.cache
+def get_dirty_tables() -> t.Union[DirtyTableRegistry, SharedDirtyTableRegistry]:
+    """
+    Return the registry of dirty tables, as configured by `MLFLOW_CRATEDB_DIRTY_TABLES`.
+    """
+    from mlflow_cratedb.environment_variables import MLFLOW_CRATEDB_DIRTY_TABLES
+
+    scope = MLFLOW_CRATEDB_DIRTY_TABLES.get().lower()
+    if scope == "process":
+        return DirtyTableRegistry()
+    if scope == "shared":
+        if sys.platform == "win32":
+            logger.warning("Shared registry of dirty tables is not supported on Windows, using process scope")
+            return DirtyTableRegistry()
+        return SharedDirtyTableRegistry()
+    raise ValueError(f"Invalid scope for registry of dirty tables: {scope}. Use one of: process, shared")
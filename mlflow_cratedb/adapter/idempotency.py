@@ -0,0 +1,47 @@
+"""
+Make inserts into tables with a natural primary key idempotent.
+
+MLflow inserts metrics through the ORM, and falls back to filtering out existing
+rows when the insert violates the primary key. With `ON CONFLICT DO NOTHING`,
+CrateDB skips existing rows by itself, so retried `log_batch` calls neither add
+duplicates, nor need another round trip. See the `natural_key` storage setting.
+"""
+
+import re
+import typing as t
+import weakref
+
+import sqlalchemy as sa
+
+from mlflow_cratedb.adapter.storage import get_storage_profiles
+
+_tables: "weakref.WeakKeyDictionary[sa.Engine, t.FrozenSet[str]]" = weakref.WeakKeyDictionary()
+
+
+def idempotent_insert(statement: str, tables: t.Iterable[str]) -> str:
+    """
+    Append `ON CONFLICT DO NOTHING` to plain `INSERT` statements into the given tables.
+    """
+    match = re.match(r'\s*INSERT INTO "?(\w+)"?\s', statement)
+    if not match or match.group(1) not in tables or "ON CONFLICT" in statement:
+        return statement
+    return f"{statement.rstrip().rstrip(';')} ON CONFLICT DO NOTHING"
+
+
+def receive_before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    tables = _tables.get(conn.engine)
+    if tables:
+        statement = idempotent_insert(statement, tables)
+    return statement, parameters
+
+
+def enable_idempotent_inserts(engine: sa.Engine):
+    """
+    Rewrite inserts into tables which use a natural primary key, according to the storage profiles.
+    """
+    tables = frozenset(get_storage_profiles(engine).natural_key_tables())
+    if not tables:
+        return
+    _tables[engine] = tables
+    if not sa.event.contains(engine, "before_cursor_execute", receive_before_cursor_execute):
+        sa.event.listen(engine, "before_cursor_execute", receive_before_cursor_execute, retval=True)
@@ -0,0 +1,94 @@
+"""
+Count and time the statements emitted by the adapter's polyfills, per table.
+
+Operations are `refresh`, for `REFRESH TABLE` statements, and `uniqueness_check`,
+for the queries emulating UNIQUE constraints.
+
+Usage:
+
+    from mlflow_cratedb.adapter.instrumentation import instrumentation
+    print(instrumentation.snapshot())
+"""
+
+import bisect
+import threading
+import time
+import typing as t
+from contextlib import contextmanager
+
+# Upper bounds of latency histogram buckets, in milliseconds.
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+
+class Histogram:
+    """
+    Latency histogram using fixed buckets, also tracking count and sum.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.sum_ms = 0.0
+        self.buckets = [0] * len(BUCKETS_MS)
+
+    def observe(self, duration_ms: float):
+        self.count += 1
+        self.sum_ms += duration_ms
+        self.buckets[bisect.bisect_left(BUCKETS_MS, duration_ms)] += 1
+
+    def to_dict(self) -> t.Dict[str, t.Any]:
+        """
+        Render the histogram, using cumulative bucket counts like Prometheus does.
+        """
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(BUCKETS_MS, self.buckets, strict=True):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+        return {"count": self.count, "sum_ms": round(self.sum_ms, 3), "buckets": buckets}
+
+
+class Instrumentation:
+    """
+    Thread-safe registry of latency histograms, per operation and table.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: t.Dict[t.Tuple[str, str], Histogram] = {}
+
+    def record(self, operation: str, tables: t.Iterable[str], duration_ms: float):
+        with self._lock:
+            for table in tables:
+                key = (operation, table)
+                if key not in self._histograms:
+                    self._histograms[key] = Histogram()
+                self._histograms[key].observe(duration_ms)
+
+    @contextmanager
+    def timed(self, operation: str, tables: t.Iterable[str]):
+        """
+        Record the duration of the enclosed block for each of the given tables.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(operation, tables, (time.perf_counter() - start) * 1000)
+
+    def snapshot(self) -> t.Dict[str, t.Dict[str, t.Dict[str, t.Any]]]:
+        """
+        Return all histograms, keyed by operation and table name.
+        """
+        outcome: t.Dict[str, t.Dict[str, t.Dict[str, t.Any]]] = {}
+        with self._lock:
+            for (operation, table), histogram in sorted(self._histograms.items()):
+                outcome.setdefault(operation, {})[table] = histogram.to_dict()
+        return outcome
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+# Process-wide instrumentation registry.
+instrumentation = Instrumentation()
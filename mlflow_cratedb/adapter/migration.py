@@ -0,0 +1,161 @@
+"""
+Migrate the database schema online, by adding columns missing from existing tables.
+
+When a new release extends `cratedb.sql`, the column definitions of its `CREATE TABLE`
+statements are compared with `information_schema.columns`, and missing columns are
+added using `ALTER TABLE ... ADD COLUMN`, without rewriting existing data.
+
+Only additive changes are applied. Columns which are part of the primary key can not
+be added to tables holding data, and changed or removed columns are left alone, so
+they are reported, and need to be migrated manually.
+
+Processes starting at the same time may migrate concurrently. When adding a column
+fails, because another process added it in the meantime, it is not applied twice.
+
+The outcome is recorded in the metadata table, by package version.
+"""
+
+import importlib.metadata
+import json
+import logging
+import re
+import typing as t
+
+import sqlalchemy as sa
+
+from mlflow_cratedb.adapter.storage import PARTITION_COLUMN
+
+logger = logging.getLogger(__name__)
+
+# Clauses of a `CREATE TABLE` statement which do not define columns.
+TABLE_CONSTRAINTS = ("PRIMARY KEY", "INDEX", "CONSTRAINT", "CHECK")
+
+# The `ALTER TABLE` statements produced by `plan_migration`.
+ALTERATION_PATTERN = re.compile(r'ALTER TABLE "(?P<table>[^"]+)" ADD COLUMN "?(?P<column>[^"\s]+)')
+
+
+def split_definitions(statement: str) -> t.List[str]:
+    """
+    Split the element list of a `CREATE TABLE` statement at top-level commas.
+    """
+    start = statement.index("(")
+    definitions: t.List[str] = []
+    depth = 0
+    quoted = False
+    current: t.List[str] = []
+    for char in statement[start + 1 :]:
+        if char == "'":
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            if depth == 0:
+                break
+            depth -= 1
+        elif not quoted and char == "," and depth == 0:
+            definitions.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    definitions.append("".join(current).strip())
+    return [definition for definition in definitions if definition]
+
+
+def column_definitions(statement: str) -> t.Dict[str, str]:
+    """
+    Return the column definitions of a `CREATE TABLE` statement, by column name.
+    """
+    columns = {}
+    for definition in split_definitions(statement):
+        if definition.upper().startswith(TABLE_CONSTRAINTS):
+            continue
+        name = definition.split()[0].strip('"')
+        columns[name] = definition
+    return columns
+
+
+def primary_key_columns(statement: str) -> t.Set[str]:
+    """
+    Return the names of the primary key columns of a `CREATE TABLE` statement.
+    """
+    match = re.search(r"PRIMARY KEY \(([^)]*)\)", statement)
+    if not match:
+        return set()
+    return {name.strip().strip('"') for name in match.group(1).split(",")}
+
+
+def existing_columns(connection: sa.Connection) -> t.Dict[str, t.Set[str]]:
+    """
+    Return the top-level column names of all tables of the current schema, by table name.
+    """
+    result = connection.execute(
+        sa.text("SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = CURRENT_SCHEMA")
+    )
+    columns: t.Dict[str, t.Set[str]] = {}
+    for table, column in result:
+        if "[" not in column:
+            columns.setdefault(table, set()).add(column)
+    return columns
+
+
+def plan_migration(
+    statements: t.Dict[str, str], existing: t.Dict[str, t.Set[str]]
+) -> t.Tuple[t.List[str], t.List[str]]:
+    """
+    Compare the `CREATE TABLE` statements by table name with the existing columns, and
+    return the `ALTER TABLE` statements adding missing columns, and the names of missing
+    columns which can not be added online.
+    """
+    alterations = []
+    unsupported = []
+    for table, statement in sorted(statements.items()):
+        if table not in existing:
+            continue
+        primary_key = primary_key_columns(statement)
+        for name, definition in column_definitions(statement).items():
+            if name in existing[table] or name == PARTITION_COLUMN:
+                continue
+            if name in primary_key or "PRIMARY KEY" in definition.upper():
+                unsupported.append(f"{table}.{name}")
+                continue
+            alterations.append(f'ALTER TABLE "{table}" ADD COLUMN {definition}')
+    return alterations, unsupported
+
+
+def added_concurrently(connection: sa.Connection, alteration: str) -> bool:
+    """
+    Whether the column added by a failed `ALTER TABLE` statement exists by now.
+    """
+    match = ALTERATION_PATTERN.match(alteration)
+    if not match:
+        return False
+    return match.group("column") in existing_columns(connection).get(match.group("table"), set())
+
+
+def migrate_schema(engine: sa.Engine, statements: t.Dict[str, str]) -> t.List[str]:
+    """
+    Add columns missing from existing tables, and return the applied `ALTER TABLE` statements.
+    """
+    from mlflow_cratedb.adapter.setup_db import _set_metadata
+
+    with engine.connect() as connection:
+        planned, unsupported = plan_migration(statements, existing_columns(connection))
+        for column in unsupported:
+            logger.warning(f"Unable to add primary key column online, please migrate manually: {column}")
+        alterations = []
+        for alteration in planned:
+            logger.info(f"Migrating database schema: {alteration}")
+            try:
+                connection.execute(sa.text(alteration))
+            except sa.exc.DBAPIError:
+                if not added_concurrently(connection, alteration):
+                    raise
+                logger.info(f"Column added concurrently, skipping: {alteration}")
+                continue
+            alterations.append(alteration)
+        version = importlib.metadata.version("mlflow-cratedb")
+        if alterations:
+            _set_metadata(connection, f"migration.{version}", json.dumps(alterations))
+        _set_metadata(connection, "schema_version", version)
+        connection.commit()
+    return alterations
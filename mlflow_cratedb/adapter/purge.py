@@ -0,0 +1,187 @@
+"""
+Delete data from many tables quickly, for resetting test databases, and for purging
+single experiments or workspaces in production.
+
+Table sizes are read from `sys.shards` first, so empty tables are skipped. `DELETE`
+statements run concurrently, because they do not depend on each other, and changed
+tables are refreshed using a single `REFRESH TABLE` statement at the end.
+"""
+
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+
+import sqlalchemy as sa
+
+from mlflow_cratedb.adapter.migration import existing_columns
+from mlflow_cratedb.adapter.uniqueness_cache import get_uniqueness_cache
+
+# Number of `DELETE` statements running concurrently.
+DELETE_CONCURRENCY = 8
+
+# Columns referencing traces, in the order of precedence.
+TRACE_COLUMNS = ("request_id", "trace_id")
+
+Deletion = t.Tuple[str, str, t.Dict[str, t.Any]]
+
+
+def refresh_tables(connection: sa.Connection, tables: t.Iterable[str]):
+    """
+    Refresh multiple tables using a single statement.
+    """
+    names = ", ".join(f'"{table}"' for table in sorted(tables))
+    if names:
+        connection.execute(sa.text(f"REFRESH TABLE {names}"))
+
+
+def table_sizes(connection: sa.Connection) -> t.Dict[str, int]:
+    """
+    Return the number of rows of all tables of the current schema, by table name.
+
+    `sys.shards` only counts refreshed rows, so refresh all tables beforehand.
+    """
+    tables = connection.execute(
+        sa.text(
+            "SELECT table_name FROM information_schema.tables "
+            "WHERE table_schema = CURRENT_SCHEMA AND table_type = 'BASE TABLE'"
+        )
+    ).scalars()
+    sizes = dict.fromkeys(tables, 0)
+    refresh_tables(connection, sizes)
+    result = connection.execute(
+        sa.text(
+            'SELECT table_name, SUM(num_docs) FROM sys.shards WHERE schema_name = CURRENT_SCHEMA AND "primary" = true '
+            "GROUP BY table_name"
+        )
+    )
+    for table, count in result:
+        if table in sizes:
+            sizes[table] = int(count or 0)
+    return sizes
+
+
+def delete_concurrently(engine: sa.Engine, deletions: t.List[Deletion]) -> t.Dict[str, int]:
+    """
+    Run `DELETE` statements concurrently, refresh the changed tables, and return the
+    number of deleted rows by table name.
+    """
+
+    def execute(deletion: Deletion) -> int:
+        _, sql, params = deletion
+        with engine.connect() as connection:
+            result = connection.execute(sa.text(sql), params)
+            connection.commit()
+            return max(result.rowcount, 0)
+
+    with ThreadPoolExecutor(max_workers=DELETE_CONCURRENCY, thread_name_prefix="cratedb-delete") as executor:
+        counts = list(executor.map(execute, deletions))
+
+    outcome: t.Dict[str, int] = {}
+    for (table, _, _), count in zip(deletions, counts, strict=True):
+        outcome[table] = outcome.get(table, 0) + count
+    with engine.connect() as connection:
+        refresh_tables(connection, outcome)
+        connection.commit()
+    for table in outcome:
+        get_uniqueness_cache().invalidate(table)
+    return outcome
+
+
+def truncate_tables(engine: sa.Engine) -> t.Dict[str, int]:
+    """
+    Delete all rows of all non-empty tables of the current schema.
+
+    The metadata table is kept, because it describes the schema, which is left intact.
+    The shadow keys of the `unique_keys` table are deleted, like the rows they belong to,
+    so the names of deleted entities can be used again.
+    """
+    from mlflow_cratedb.adapter.setup_db import METADATA_TABLE
+
+    with engine.connect() as connection:
+        sizes = table_sizes(connection)
+    deletions: t.List[Deletion] = [
+        (table, f'DELETE FROM "{table}"', {})  # noqa: S608
+        for table, size in sorted(sizes.items())
+        if size and table != METADATA_TABLE
+    ]
+    return delete_concurrently(engine, deletions)
+
+
+def purge_experiments(
+    engine: sa.Engine, experiment_ids: t.Optional[t.List[int]] = None, workspace: t.Optional[str] = None
+) -> t.Dict[str, int]:
+    """
+    Delete experiments, either by identifier, or all experiments of a workspace, including
+    their runs and traces, and return the number of deleted rows by table name.
+
+    Rows are deleted from all tables which reference the experiments by `experiment_id`,
+    their runs by `run_uuid`, or their traces by `request_id` or `trace_id`. Dataset inputs
+    of their runs are deleted from `inputs` by `destination_id`, and their tags from
+    `input_tags` by `input_uuid`. When purging
+    a workspace, rows of all tables having a `workspace` column, and the workspace itself,
+    are deleted as well.
+    """
+    if (experiment_ids is None) == (workspace is None):
+        raise ValueError("Either experiment identifiers or a workspace must be given")
+    with engine.connect() as connection:
+        sizes = table_sizes(connection)
+        columns = existing_columns(connection)
+        if workspace is not None:
+            experiment_ids = list(
+                connection.execute(
+                    sa.text("SELECT experiment_id FROM experiments WHERE workspace = :workspace"),
+                    {"workspace": workspace},
+                ).scalars()
+            )
+        run_uuids: t.List[str] = []
+        request_ids: t.List[str] = []
+        input_uuids: t.List[str] = []
+        if experiment_ids:
+            params = {"experiment_ids": experiment_ids}
+            run_uuids = list(
+                connection.execute(
+                    sa.text("SELECT run_uuid FROM runs WHERE experiment_id = ANY(:experiment_ids)"), params
+                ).scalars()
+            )
+            request_ids = list(
+                connection.execute(
+                    sa.text("SELECT request_id FROM trace_info WHERE experiment_id = ANY(:experiment_ids)"), params
+                ).scalars()
+            )
+        if run_uuids and sizes.get("inputs"):
+            input_uuids = list(
+                connection.execute(
+                    sa.text(
+                        "SELECT input_uuid FROM inputs "
+                        "WHERE destination_type = 'RUN' AND destination_id = ANY(:run_uuids)"
+                    ),
+                    {"run_uuids": run_uuids},
+                ).scalars()
+            )
+
+    deletions: t.List[Deletion] = []
+    for table, size in sorted(sizes.items()):
+        if not size:
+            continue
+        names = columns.get(table, set())
+        if workspace is not None and "workspace" in names:
+            sql = f'DELETE FROM "{table}" WHERE workspace = :workspace'  # noqa: S608
+            deletions.append((table, sql, {"workspace": workspace}))
+        elif workspace is not None and table == "workspaces":
+            deletions.append((table, 'DELETE FROM "workspaces" WHERE name = :workspace', {"workspace": workspace}))
+        elif table in ("inputs", "input_tags"):
+            if input_uuids:
+                sql = f'DELETE FROM "{table}" WHERE input_uuid = ANY(:values)'  # noqa: S608
+                deletions.append((table, sql, {"values": input_uuids}))
+        elif "experiment_id" in names and experiment_ids:
+            sql = f'DELETE FROM "{table}" WHERE experiment_id = ANY(:values)'  # noqa: S608
+            deletions.append((table, sql, {"values": experiment_ids}))
+        elif "run_uuid" in names and run_uuids:
+            sql = f'DELETE FROM "{table}" WHERE run_uuid = ANY(:values)'  # noqa: S608
+            deletions.append((table, sql, {"values": run_uuids}))
+        elif request_ids:
+            for column in TRACE_COLUMNS:
+                if column in names:
+                    sql = f'DELETE FROM "{table}" WHERE {column} = ANY(:values)'  # noqa: S608
+                    deletions.append((table, sql, {"values": request_ids}))
+                    break
+    return delete_concurrently(engine, deletions)
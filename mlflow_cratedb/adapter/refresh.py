@@ -0,0 +1,334 @@
+"""
+Synchronize data written to CrateDB using `REFRESH TABLE`, according to a consistency mode.
+"""
+
+import atexit
+import dataclasses
+import functools
+import logging
+import re
+import threading
+import time
+import typing as t
+import weakref
+from enum import Enum
+
+import sqlalchemy as sa
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList
+
+from mlflow_cratedb.adapter.dirty_tables import get_dirty_tables
+from mlflow_cratedb.adapter.instrumentation import instrumentation
+from mlflow_cratedb.adapter.storage import get_storage_profiles
+
+logger = logging.getLogger(__name__)
+
+# Query parameters of `crate://` URIs which are consumed by the adapter, not by the database driver.
+URI_PARAMETERS = ("consistency", "max_staleness_ms", "refresh_interval_ms")
+
+
+class ConsistencyMode(str, Enum):
+    """
+    Define how tables modified through the ORM are synchronized.
+
+    - strict:     Refresh modified tables after each session flush.
+    - per-commit: Refresh modified tables once, when the session is committed.
+    - debounced:  Refresh modified tables in the background, within a maximum staleness.
+    - on-read:    Refresh modified tables lazily, right before they are read again.
+    - none:       Do not refresh, rely on CrateDB's periodic refresh.
+    """
+
+    STRICT = "strict"
+    PER_COMMIT = "per-commit"
+    DEBOUNCED = "debounced"
+    ON_READ = "on-read"
+    NONE = "none"
+
+    @classmethod
+    def parse(cls, value: str) -> "ConsistencyMode":
+        try:
+            return cls(value.lower())
+        except ValueError as ex:
+            modes = ", ".join(mode.value for mode in cls)
+            raise ValueError(f"Invalid consistency mode: {value}. Use one of: {modes}") from ex
+
+
+def refresh_statement(tables: t.Iterable[str]) -> str:
+    """
+    Render a single `REFRESH TABLE` statement covering all given tables.
+    """
+    return f"REFRESH TABLE {', '.join(sorted(tables))}"
+
+
+def refresh_tables(connection, tables: t.Iterable[str]):
+    """
+    Invoke a single `REFRESH TABLE` statement covering all given tables.
+    """
+    tables = list(tables)
+    with instrumentation.timed("refresh", tables):
+        connection.execute(sa.text(refresh_statement(tables)))
+
+
+class DebouncedRefresher:
+    """
+    Background service collecting names of modified tables, and refreshing them
+    using a single `REFRESH TABLE` statement, off the write path.
+
+    Submissions are merged while they keep arriving within `interval_ms`
+    milliseconds, but tables are refreshed at most `max_staleness_ms`
+    milliseconds after they have been submitted first. Pending tables are
+    refreshed when the service is closed, or when the process exits.
+    """
+
+    def __init__(self, engine: sa.Engine, max_staleness_ms: int, interval_ms: int = 100):
+        self.engine = engine
+        self.max_staleness = max_staleness_ms / 1000
+        self.interval = min(interval_ms, max_staleness_ms) / 1000
+        self._pending: t.Set[str] = set()
+        self._first_submitted = 0.0
+        self._last_submitted = 0.0
+        self._last_refreshed = 0.0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closing = threading.Event()
+        self._thread: t.Optional[threading.Thread] = None
+
+    def submit(self, tables: t.Iterable[str]):
+        now = time.monotonic()
+        with self._lock:
+            if not self._pending:
+                self._first_submitted = now
+            self._pending.update(tables)
+            self._last_submitted = now
+            closing = self._closing.is_set()
+            if self._thread is None and not closing:
+                self._thread = threading.Thread(target=self._run, name="cratedb-refresher", daemon=True)
+                self._thread.start()
+                _refreshers.add(self)
+        # After closing, no background thread refreshes tables anymore, so refresh them right away.
+        if closing:
+            self.flush()
+            return
+        self._wakeup.set()
+
+    def flush(self):
+        """
+        Refresh all pending tables now. On failure, they will be retried with the next flush.
+        """
+        with self._lock:
+            tables, self._pending = self._pending, set()
+        if not tables:
+            return
+        try:
+            with self.engine.connect() as connection:
+                refresh_tables(connection, tables)
+                connection.commit()
+        except Exception:
+            with self._lock:
+                if not self._pending:
+                    self._first_submitted = time.monotonic()
+                self._pending.update(tables)
+            raise
+        finally:
+            self._last_refreshed = time.monotonic()
+
+    def close(self):
+        """
+        Stop the background thread, and refresh all pending tables.
+        Engines connecting to the same database afterwards will use a new refresher.
+        """
+        self._closing.set()
+        for database, refresher in list(_refreshers_by_database.items()):
+            if refresher is self:
+                del _refreshers_by_database[database]
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _due(self) -> float:
+        """
+        Return the point in time when pending tables should be refreshed.
+        """
+        with self._lock:
+            deadline = self._first_submitted + self.max_staleness
+            quiet = max(self._last_submitted, self._last_refreshed) + self.interval
+        return min(quiet, deadline)
+
+    def _run(self):
+        while not self._closing.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while not self._closing.is_set() and (delay := self._due() - time.monotonic()) > 0:
+                self._closing.wait(delay)
+            if self._closing.is_set():
+                return
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Refreshing tables failed")
+                self._closing.wait(self.max_staleness)
+                self._wakeup.set()
+
+
+# Running refreshers, to be flushed on shutdown.
+_refreshers: "weakref.WeakSet[DebouncedRefresher]" = weakref.WeakSet()
+
+# Refreshers per database, shared by all engines connected to the same database.
+_refreshers_by_database: t.Dict[str, DebouncedRefresher] = {}
+
+
+@atexit.register
+def close_refreshers():
+    """
+    Refresh all pending tables before the process exits.
+    """
+    for refresher in list(_refreshers):
+        try:
+            refresher.close()
+        except Exception:
+            logger.exception("Refreshing tables on shutdown failed")
+
+
+# Statements which need to see the most recent writes to the tables they reference.
+_READ_STATEMENT = re.compile(r"^\s*(SELECT|WITH|UPDATE|DELETE)\b", re.IGNORECASE)
+_IDENTIFIER = re.compile(r"\w+")
+
+
+@functools.lru_cache(maxsize=1024)
+def _statement_tables(statement: str) -> t.FrozenSet[str]:
+    """
+    Return all identifiers of a reading SQL statement, as candidates for table names.
+    """
+    if not _READ_STATEMENT.match(statement):
+        return frozenset()
+    return frozenset(_IDENTIFIER.findall(statement))
+
+
+def is_primary_key_lookup(context, exclude: t.Collection[str] = ()) -> bool:
+    """
+    Whether a statement exclusively looks up rows of a single table by its full primary key.
+
+    CrateDB serves such lookups in real time, so they do not need a `REFRESH TABLE`.
+    Classification happens per statement instead of per table, because tables like
+    `runs` or `experiments` are also scanned by search operations.
+
+    Tables partitioned by time are excluded, because their primary key in the database
+    also includes the partition column, which is not part of the model.
+    """
+    compiled = getattr(context, "compiled", None)
+    compile_state = getattr(compiled, "compile_state", None)
+    statement = getattr(compile_state, "statement", None)
+    if not isinstance(statement, sa.Select) or statement.whereclause is None:
+        return False
+    froms = statement.get_final_froms()
+    if len(froms) != 1 or not isinstance(froms[0], sa.Table):
+        return False
+    table = froms[0]
+    if table.name in exclude:
+        return False
+    criteria = [statement.whereclause]
+    if isinstance(statement.whereclause, BooleanClauseList) and statement.whereclause.operator is operators.and_:
+        criteria = list(statement.whereclause.clauses)
+    columns = set()
+    for criterion in criteria:
+        if not (
+            isinstance(criterion, BinaryExpression)
+            and criterion.operator is operators.eq
+            and isinstance(criterion.left, sa.Column)
+            and criterion.left.table is table
+            and isinstance(criterion.right, BindParameter)
+        ):
+            return False
+        columns.add(criterion.left.name)
+    return bool(columns) and columns == {column.name for column in table.primary_key.columns}
+
+
+def database_key(engine: sa.Engine) -> str:
+    """
+    Identify the database an engine is connected to, without exposing credentials.
+    The synchronous and asynchronous variants of a driver identify the same database.
+    """
+    url = engine.url
+    return url.set(drivername=url.drivername.removesuffix("_async")).render_as_string(hide_password=True)
+
+
+def refresh_on_read(engine: sa.Engine):
+    """
+    Invoke `REFRESH TABLE` right before a statement reads from tables flagged as dirty.
+    """
+    database = database_key(engine)
+    dirty_tables = get_dirty_tables()
+    partitioned = get_storage_profiles(engine).partitioned_tables()
+
+    def receive_before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        tables = _statement_tables(statement)
+        if not tables:
+            return
+        generations = dirty_tables.dirty(database, tables)
+        if generations and not is_primary_key_lookup(context, partitioned):
+            with instrumentation.timed("refresh", generations):
+                cursor.execute(refresh_statement(generations))
+            dirty_tables.clean(database, generations)
+
+    sa.event.listen(engine, "before_cursor_execute", receive_before_cursor_execute)
+
+
+@dataclasses.dataclass
+class RefreshPolicy:
+    """
+    Per-engine settings about how to synchronize modified tables.
+    """
+
+    mode: ConsistencyMode = ConsistencyMode.STRICT
+    max_staleness_ms: int = 1000
+    refresh_interval_ms: int = 100
+    refresher: t.Optional[DebouncedRefresher] = None
+
+    @classmethod
+    def from_url(cls, url: sa.URL) -> "RefreshPolicy":
+        """
+        Derive settings from `crate://` URI query parameters, or from environment variables.
+        """
+        from mlflow_cratedb.environment_variables import (
+            MLFLOW_CRATEDB_CONSISTENCY,
+            MLFLOW_CRATEDB_MAX_STALENESS_MS,
+            MLFLOW_CRATEDB_REFRESH_INTERVAL_MS,
+        )
+
+        mode = url.query.get("consistency") or MLFLOW_CRATEDB_CONSISTENCY.get()
+        max_staleness_ms = url.query.get("max_staleness_ms") or MLFLOW_CRATEDB_MAX_STALENESS_MS.get()
+        refresh_interval_ms = url.query.get("refresh_interval_ms") or MLFLOW_CRATEDB_REFRESH_INTERVAL_MS.get()
+        return cls(
+            mode=ConsistencyMode.parse(str(mode)),
+            max_staleness_ms=int(str(max_staleness_ms)),
+            refresh_interval_ms=int(str(refresh_interval_ms)),
+        )
+
+
+_policies: "weakref.WeakKeyDictionary[sa.Engine, RefreshPolicy]" = weakref.WeakKeyDictionary()
+
+
+def set_refresh_policy(engine: sa.Engine, policy: RefreshPolicy):
+    if policy.mode is ConsistencyMode.DEBOUNCED and policy.refresher is None:
+        database = database_key(engine)
+        if database not in _refreshers_by_database:
+            _refreshers_by_database[database] = DebouncedRefresher(
+                engine, policy.max_staleness_ms, policy.refresh_interval_ms
+            )
+        policy.refresher = _refreshers_by_database[database]
+    if policy.mode is ConsistencyMode.ON_READ:
+        refresh_on_read(engine)
+    _policies[engine] = policy
+
+
+def get_refresh_policy(bind: t.Union[sa.Engine, sa.Connection]) -> RefreshPolicy:
+    """
+    Return the refresh policy of an engine, defaulting to the environment configuration.
+    """
+    engine = bind.engine
+    policy = _policies.get(engine)
+    if policy is None:
+        policy = RefreshPolicy.from_url(engine.url)
+        set_refresh_policy(engine, policy)
+    return policy
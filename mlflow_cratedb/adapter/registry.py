@@ -0,0 +1,57 @@
+"""
+Share a single SQLAlchemy engine, and its connection pool, per database within a process.
+
+In the MLflow server, the tracking store, the model registry store, the workspace store,
+the authentication store, and the job store each create an engine for the same URI.
+Sharing engines reduces the number of idle database connections, and lets the stores
+share state per engine, like provisioning the database schema, or refresh policies.
+
+URIs are normalized before looking up engines, so the order of query parameters does
+not matter. The size of the shared pool is configured using MLflow's environment variables
+`MLFLOW_SQLALCHEMYSTORE_POOL_SIZE` and `MLFLOW_SQLALCHEMYSTORE_MAX_OVERFLOW`.
+"""
+
+import threading
+import typing as t
+
+import sqlalchemy as sa
+
+from mlflow_cratedb.adapter.cluster import join_servers, split_servers
+
+_engines: t.Dict[str, sa.Engine] = {}
+_engines_lock = threading.Lock()
+
+
+def normalize_uri(db_uri: str) -> str:
+    """
+    Render a database URI in canonical form, with sorted query parameters.
+    """
+    db_uri, servers = split_servers(db_uri)
+    url = sa.make_url(db_uri)
+    url = url.set(drivername=url.drivername.lower(), query=dict(sorted(url.query.items())))
+    return join_servers(url.render_as_string(hide_password=False), servers)
+
+
+def get_shared_engine(db_uri: str, factory: t.Callable[[str], sa.Engine]) -> sa.Engine:
+    """
+    Return the engine for a database URI, creating it using the factory on first use.
+    """
+    key = normalize_uri(db_uri)
+    engine = _engines.get(key)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(key)
+            if engine is None:
+                engine = factory(db_uri)
+                _engines[key] = engine
+    return engine
+
+
+def dispose_engines():
+    """
+    Close the connection pools of all shared engines, and forget them.
+    """
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
@@ -0,0 +1,97 @@
+"""
+Drop expired data of tables partitioned by time, see `mlflow_cratedb.adapter.storage`.
+
+A `DELETE` statement which only filters on partition columns makes CrateDB drop
+whole partitions, instead of deleting rows one by one. Therefore, only partitions
+which exclusively contain rows older than the cutoff are dropped.
+
+The cutoff is either given explicitly, or derived from the `ttl_days` setting of
+the storage profile of each table.
+"""
+
+import datetime as dt
+import re
+import typing as t
+
+import sqlalchemy as sa
+
+from mlflow_cratedb.adapter.storage import PARTITION_COLUMN, TIME_COLUMNS, get_storage_profiles
+
+
+def partition_unit(connection, table: str) -> t.Optional[str]:
+    """
+    Return the time unit a table is partitioned by, derived from its generated partition column.
+    """
+    expression = connection.execute(
+        sa.text(
+            "SELECT generation_expression FROM information_schema.columns "
+            "WHERE table_schema = CURRENT_SCHEMA AND table_name = :table AND column_name = :column"
+        ),
+        {"table": table, "column": PARTITION_COLUMN},
+    ).scalar()
+    match = re.search(r"date_trunc\('(\w+)'", expression or "")
+    return match.group(1) if match else None
+
+
+def partition_boundary(cutoff: dt.datetime, unit: str) -> dt.datetime:
+    """
+    Return the start of the partition containing the cutoff. All earlier partitions are expired.
+    """
+    cutoff = cutoff.astimezone(dt.timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if unit == "week":
+        return cutoff - dt.timedelta(days=cutoff.weekday())
+    if unit == "month":
+        return cutoff.replace(day=1)
+    return cutoff
+
+
+def drop_partitions(engine: sa.Engine, table: str, cutoff: dt.datetime) -> int:
+    """
+    Drop all partitions of a table which only contain rows older than the cutoff,
+    and return the number of dropped partitions.
+    """
+    with engine.connect() as connection:
+        unit = partition_unit(connection, table)
+        if unit is None:
+            raise ValueError(f"Table is not partitioned by time: {table}")
+        boundary = int(partition_boundary(cutoff, unit).timestamp() * 1000)
+        expired = connection.execute(
+            sa.text(
+                "SELECT COUNT(*) FROM information_schema.table_partitions "  # noqa: S608
+                "WHERE table_schema = CURRENT_SCHEMA AND table_name = :table "
+                f"AND values['{PARTITION_COLUMN}'] < :boundary"
+            ),
+            {"table": table, "boundary": boundary},
+        ).scalar()
+        if expired:
+            connection.execute(
+                sa.text(f'DELETE FROM "{table}" WHERE "{PARTITION_COLUMN}" < :boundary'),  # noqa: S608
+                {"boundary": boundary},
+            )
+        connection.commit()
+    return expired or 0
+
+
+def purge_expired(
+    engine: sa.Engine, tables: t.Optional[t.Iterable[str]] = None, older_than_days: t.Optional[int] = None
+) -> t.Dict[str, t.Optional[int]]:
+    """
+    Drop expired partitions of tables partitioned by time, and return the number of dropped
+    partitions per table, or `None` for tables which have no time to live.
+
+    By default, all tables partitioned by time are processed, using the time to live of
+    their storage profiles, unless `older_than_days` is given.
+    """
+    if tables is None:
+        with engine.connect() as connection:
+            tables = [table for table in TIME_COLUMNS if partition_unit(connection, table) is not None]
+    profiles = get_storage_profiles(engine)
+    now = dt.datetime.now(tz=dt.timezone.utc)
+    outcome: t.Dict[str, t.Optional[int]] = {}
+    for table in tables:
+        days = older_than_days if older_than_days is not None else profiles.get(table).ttl_days
+        if days is None:
+            outcome[table] = None
+            continue
+        outcome[table] = drop_partitions(engine, table, now - dt.timedelta(days=days))
+    return outcome
@@ -0,0 +1,112 @@
+"""
+Apply session settings to the database connections of an engine.
+
+With the `crate+psycopg://` dialect, settings are applied once per database connection,
+which owns a session on the server. The HTTP driver of the `crate://` dialect has no such
+session: settings are bound to the keep-alive socket of its HTTP connection pool, which
+may be replaced at any time, so they are re-applied on each checkout from the pool.
+
+By default, accessing unknown keys of `OBJECT(DYNAMIC)` columns returns `NULL` instead of
+failing, and the `search_path` is set to the schema given by the `schema` query parameter
+of the `crate://` URI. Additional settings can be defined using query parameters like
+`session.<setting>=<value>`. Values other than numbers and booleans are rendered as string
+literals, so they do not need to be quoted.
+
+Example URI: `crate://localhost/?schema=mlflow&session.statement_timeout=30s`
+"""
+
+import re
+import typing as t
+
+import sqlalchemy as sa
+
+# Query parameters of `crate://` URIs which are consumed by the adapter, not by the database driver.
+URI_PARAMETER_PREFIX = "session."
+
+# Database drivers whose connections own a server-side session, see `mlflow_cratedb.adapter.dialect`.
+SESSION_DRIVERS = ("psycopg", "psycopg_async")
+
+# Names of session settings, and values which are rendered without quotes.
+NAME_PATTERN = re.compile(r"^\w+$")
+UNQUOTED_PATTERN = re.compile(r"^(-?\d+(\.\d+)?|true|false)$", re.IGNORECASE)
+
+DEFAULT_SETTINGS = {
+    # Relax OBJECT(DYNAMIC) attribute access behaviour where attribute does not exist yet.
+    # Example: SELECT spans.dimension_attributes['mlflow.llm.model']
+    # Error:   Column dimension_attributes['mlflow.llm.model'] unknown
+    "error_on_unknown_object_key": "false",
+}
+
+
+class SessionSettings:
+    """
+    Session settings of all connections of an engine.
+    """
+
+    def __init__(self, settings: t.Optional[t.Dict[str, str]] = None):
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.settings.update(settings or {})
+
+    @classmethod
+    def from_url(cls, url: sa.URL) -> "SessionSettings":
+        """
+        Derive settings from the `schema` and `session.<setting>` query parameters of a `crate://` URI.
+        """
+        settings = {}
+        schema = url.query.get("schema")
+        if schema:
+            settings["search_path"] = str(schema)
+        for key, value in url.query.items():
+            if key.startswith(URI_PARAMETER_PREFIX):
+                name = key[len(URI_PARAMETER_PREFIX) :]
+                if not NAME_PATTERN.match(name):
+                    raise ValueError(f"Invalid session parameter: {key}. Use `session.<setting>`")
+                settings[name] = value if isinstance(value, str) else value[-1]
+        return cls(settings)
+
+    def statements(self) -> t.List[str]:
+        from sqlalchemy_cratedb.support import quote_relation_name
+
+        statements = []
+        for name, value in self.settings.items():
+            if name == "search_path":
+                value = quote_relation_name(value)
+            elif not UNQUOTED_PATTERN.match(value):
+                value = "'" + value.replace("'", "''") + "'"
+            statements.append(f"SET {name} = {value}")
+        return statements
+
+    def receive_connect(self, dbapi_connection, connection_record):
+        """
+        Apply the settings to a new DBAPI connection, see the `connect` pool event.
+        """
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in self.statements():
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+    def receive_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        """
+        Re-apply the settings to a DBAPI connection, see the `checkout` pool event.
+        """
+        self.receive_connect(dbapi_connection, connection_record)
+
+
+def uri_parameters(url: sa.URL) -> t.List[str]:
+    """
+    Return the query parameters of a `crate://` URI which define session settings.
+    """
+    return [key for key in url.query if key.startswith(URI_PARAMETER_PREFIX)]
+
+
+def enable_session_settings(engine: sa.Engine, settings: SessionSettings):
+    """
+    Apply session settings when the pool of an engine opens a new DBAPI connection, or,
+    for drivers without a server-side session, each time a connection is checked out.
+    """
+    if engine.dialect.driver in SESSION_DRIVERS:
+        sa.event.listen(engine, "connect", settings.receive_connect)
+    else:
+        sa.event.listen(engine, "checkout", settings.receive_checkout)
@@ -1,14 +1,87 @@
+import hashlib
 import importlib.resources
-from typing import cast
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, cast
 
 import sqlalchemy as sa
-import sqlparse
+
+from mlflow_cratedb.adapter.migration import migrate_schema
+from mlflow_cratedb.adapter.purge import truncate_tables
+from mlflow_cratedb.adapter.storage import count_nodes, get_storage_profiles
+from mlflow_cratedb.adapter.unique_keys import forget_provisioned
+from mlflow_cratedb.adapter.uniqueness_cache import get_uniqueness_cache
 
 
 def read_ddl(filename: str):
     return importlib.resources.files("mlflow_cratedb.adapter.ddl").joinpath(filename).read_text()
 
 
+def read_ddl_bundle(filename: str = "cratedb.json") -> List[Dict[str, str]]:
+    """
+    Read the pre-split DDL statements shipped with the package, see `bundle_ddl`.
+    """
+    return json.loads(read_ddl(filename))
+
+
+def split_ddl(filename: str = "cratedb.sql") -> List[Dict[str, str]]:
+    """
+    Split a DDL file into individual statements, annotated with their table names.
+    """
+    import sqlparse
+
+    statements = []
+    for statement in sqlparse.split(read_ddl(filename)):
+        statement = sqlparse.format(statement, strip_comments=True).strip()
+        match = re.match(r'CREATE TABLE IF NOT EXISTS "(\w+)"', statement)
+        statements.append({"table": match.group(1) if match else "", "statement": statement})
+    return statements
+
+
+def bundle_ddl(filename: str = "cratedb.sql"):
+    """
+    Store the statements of a DDL file next to it as JSON, so provisioning does not need to parse SQL.
+
+    Run `poe bundle-ddl` after editing `cratedb.sql`.
+    """
+    path = Path(__file__).parent / "ddl" / Path(filename).with_suffix(".json").name
+    path.write_text(json.dumps(split_ddl(filename), indent=2) + "\n")
+
+
+# Number of DDL statements running concurrently when provisioning the database schema.
+DDL_CONCURRENCY = 8
+
+
+# Table storing metadata of the adapter, like the fingerprint of the provisioned DDL.
+METADATA_TABLE = "adapter_metadata"
+
+
+def _get_metadata(connection: sa.Connection, key: str) -> Optional[str]:
+    """
+    Look up a metadata value by primary key, which CrateDB serves in real time.
+    Return `None` when the metadata table does not exist yet.
+    """
+    try:
+        return connection.execute(
+            sa.text(f'SELECT value FROM "{METADATA_TABLE}" WHERE key = :key'),  # noqa: S608
+            {"key": key},
+        ).scalar()
+    except sa.exc.ProgrammingError:
+        return None
+
+
+def _set_metadata(connection: sa.Connection, key: str, value: str):
+    connection.execute(
+        sa.text(
+            f'INSERT INTO "{METADATA_TABLE}" (key, value) VALUES (:key, :value) '  # noqa: S608
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value"
+        ),
+        {"key": key, "value": value},
+    )
+
+
 def _setup_db_create_tables(engine: sa.Engine):
     """
     Because CrateDB does not play well with a full-fledged SQLAlchemy data model and
@@ -17,12 +90,34 @@ def _setup_db_create_tables(engine: sa.Engine):
 
     It will cause additional maintenance, but well, c'est la vie.
 
+    A fingerprint of the DDL and the storage profiles is recorded in the metadata
+    table, so processes starting against an already provisioned database skip
+    running it. Otherwise, the pre-split `CREATE TABLE` statements of `cratedb.json`
+    run concurrently, because they do not depend on each other. Afterwards, columns
+    missing from tables which existed before are added, see `migrate_schema`.
+
     TODO: Currently, the path is hardcoded to `cratedb.sql`.
     """
-    sql_statements = read_ddl("cratedb.sql")
+    profiles = get_storage_profiles(engine)
+    fingerprint = hashlib.sha256((read_ddl("cratedb.json") + profiles.fingerprint()).encode("utf-8")).hexdigest()
     with engine.connect() as connection:
-        for statement in sqlparse.split(sql_statements):
+        if _get_metadata(connection, "ddl_fingerprint") == fingerprint:
+            return
+        nodes = count_nodes(connection)
+
+    def execute(statement: str):
+        with engine.connect() as connection:
             connection.execute(sa.text(statement))
+            connection.commit()
+
+    statements = {item["table"]: profiles.render(item["table"], item["statement"], nodes) for item in read_ddl_bundle()}
+    with ThreadPoolExecutor(max_workers=DDL_CONCURRENCY, thread_name_prefix="cratedb-ddl") as executor:
+        list(executor.map(execute, statements.values()))
+
+    migrate_schema(engine, statements)
+
+    with engine.connect() as connection:
+        _set_metadata(connection, "ddl_fingerprint", fingerprint)
         connection.commit()
 
 
@@ -30,11 +125,14 @@ def _setup_db_drop_tables(engine: sa.Engine):
     """
     Drop all relevant database tables. Handle with care.
     """
+    import sqlparse
+
     sql_statements = read_ddl("drop.sql")
     with engine.connect() as connection:
         for statement in sqlparse.split(sql_statements):
             connection.execute(sa.text(statement))
         connection.commit()
+    _forget_state()
 
 
 def _get_schema(engine: sa.Engine) -> str:
@@ -53,15 +151,21 @@ def _setup_db_drop_schema(engine: sa.Engine):
     with engine.connect() as connection:
         connection.execute(sa.text(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE'))  # noqa: S608
         connection.commit()
+    _forget_state()
 
 
 def _setup_db_truncate_tables(engine: sa.Engine):
-    """Delete data from all relevant database tables. Handle with care."""
-    schema = _get_schema(engine)
-    with engine.connect() as connection:
-        inspector = sa.inspect(engine)
-        all_tables = inspector.get_table_names(schema=schema)
-        for table in all_tables:
-            connection.execute(sa.text(f'DELETE FROM "{table}"'))  # noqa: S608
-            connection.execute(sa.text(f'REFRESH TABLE "{table}"'))  # noqa: S608
-        connection.commit()
+    """
+    Delete data from all relevant database tables. Handle with care.
+
+    Empty tables are skipped, and the others are truncated concurrently, see `truncate_tables`.
+    """
+    _get_schema(engine)
+    truncate_tables(engine)
+    _forget_state()
+
+
+def _forget_state():
+    """Forget in-process state about tables which have been dropped or truncated."""
+    get_uniqueness_cache().clear()
+    forget_provisioned()
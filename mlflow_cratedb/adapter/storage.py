@@ -0,0 +1,344 @@
+"""
+Apply per-table storage profiles to the `CREATE TABLE` statements of the DDL.
+
+A storage profile defines the routing column and the number of shards of a
+table, either fixed, or scaled by the number of cluster nodes at setup time,
+the number of replicas, the refresh interval, and the compression codec.
+Tables with a time column can also be partitioned by day, week, or month,
+using a generated column, so old data can be dropped partition by partition,
+optionally after a time to live in days. Profiles are merged from built-in
+defaults, an optional YAML or JSON file, and `crate://` URI query parameters,
+in this order.
+
+The opt-in `large_values` setting stores large, non-filterable text columns
+without index and column store, lifting the size limit of indexed values.
+The opt-in `natural_key` setting adds a primary key to tables without one,
+so inserting the same row twice is a no-op, see `mlflow_cratedb.adapter.idempotency`.
+
+Routing columns must be part of the primary key of a table, if it has one.
+
+Example file, where `*` applies to all tables:
+
+    "*":
+      replicas: "0-1"
+    metrics:
+      shards_per_node: 4
+      codec: best_compression
+      refresh_interval: 5000
+      partition_by: month
+      ttl_days: 365
+    jobs:
+      large_values: true
+
+Example URI: `crate://localhost/?schema=mlflow&storage.metrics.shards=12`
+"""
+
+import dataclasses
+import hashlib
+import json
+import math
+import re
+import typing as t
+import weakref
+
+import sqlalchemy as sa
+
+# Query parameters of `crate://` URIs which are consumed by the adapter, not by the database driver.
+URI_PARAMETER_FILE = "storage_profiles"
+URI_PARAMETER_PREFIX = "storage."
+
+# Key for settings applying to all tables.
+ALL_TABLES = "*"
+
+# Generated column used for partitioning tables by time.
+PARTITION_COLUMN = "partition_time"
+PARTITION_UNITS = ("day", "week", "month")
+
+# Columns holding large payloads, which MLflow only reads back, and never uses for filtering,
+# sorting, or grouping. `params.value` is not included, because run search filters and
+# orders by parameter values, and neither is `spans.content`, because trace search filters
+# on span attributes using `LIKE` and `RLIKE` predicates on it.
+# With the `large_values` setting, they are stored without index and column store, which
+# lifts the size limit of indexed values, and reduces write cost and disk footprint.
+LARGE_VALUE_COLUMNS = {
+    "datasets": ("dataset_source", "dataset_profile"),
+    "jobs": ("result",),
+    "scorer_versions": ("serialized_scorer",),
+    "secrets": ("encrypted_value",),
+}
+LARGE_VALUE_OPTIONS = "INDEX OFF STORAGE WITH (columnstore = false)"
+
+# Primary keys of tables which have none by default, matching the model of MLflow.
+# With the `natural_key` setting, retried inserts of the same rows do not add duplicates.
+NATURAL_KEYS = {
+    "metrics": ("run_uuid", "key", "step", "timestamp", "value", "is_nan"),
+}
+
+# Expressions computing the point in time in milliseconds of rows of tables which can be partitioned.
+# CrateDB prunes partitions of queries filtering on the referenced time column.
+# `trace_info` is not included, because MLflow updates `trace_info.timestamp_ms` when logging spans,
+# and when merging traces started twice, which CrateDB rejects for columns the partition is derived
+# from. Also, including the partition column into its primary key would let duplicate traces pass.
+TIME_COLUMNS = {
+    "metrics": '"timestamp"',
+    "spans": "start_time_unix_nano / 1000000",
+}
+
+
+@dataclasses.dataclass
+class StorageProfile:
+    """
+    Storage settings of a single table. Settings which are `None` use CrateDB's defaults.
+    """
+
+    clustered_by: t.Optional[str] = None
+    shards: t.Optional[int] = None
+    shards_per_node: t.Optional[float] = None
+    replicas: t.Optional[str] = None
+    refresh_interval: t.Optional[int] = None
+    codec: t.Optional[str] = None
+    partition_by: t.Optional[str] = None
+    ttl_days: t.Optional[int] = None
+    large_values: t.Optional[bool] = None
+    natural_key: t.Optional[bool] = None
+
+    @classmethod
+    def from_dict(cls, data: t.Dict[str, t.Any]) -> "StorageProfile":
+        """
+        Create a profile from a mapping of settings, converting values from strings when needed.
+        """
+        fields = {field.name: field for field in dataclasses.fields(cls)}
+        kwargs = {}
+        for name, value in data.items():
+            if name not in fields:
+                raise ValueError(f"Invalid storage setting: {name}. Use one of: {', '.join(fields)}")
+            kwargs[name] = None if value is None else _TYPES[name](value)
+        return cls(**kwargs)
+
+    def merge(self, other: "StorageProfile") -> "StorageProfile":
+        """
+        Return a new profile, where settings of the other profile take precedence.
+        """
+        overrides = {key: value for key, value in dataclasses.asdict(other).items() if value is not None}
+        return dataclasses.replace(self, **overrides)
+
+    def number_of_shards(self, nodes: int) -> t.Optional[int]:
+        if self.shards is not None:
+            return self.shards
+        if self.shards_per_node is not None:
+            return max(1, math.ceil(self.shards_per_node * nodes))
+        return None
+
+    def render(self, nodes: int) -> str:
+        """
+        Render the `PARTITIONED BY`, `CLUSTERED`, and `WITH` clauses of a `CREATE TABLE` statement.
+        """
+        clauses = []
+        if self.partition_by is not None:
+            clauses.append(f'PARTITIONED BY ("{PARTITION_COLUMN}")')
+        shards = self.number_of_shards(nodes)
+        clustered = ["CLUSTERED"]
+        if self.clustered_by is not None:
+            clustered.append(f'BY ("{self.clustered_by}")')
+        if shards is not None:
+            clustered.append(f"INTO {shards} SHARDS")
+        if len(clustered) > 1:
+            clauses.append(" ".join(clustered))
+        parameters = []
+        if self.replicas is not None:
+            parameters.append(f"number_of_replicas = '{self.replicas}'")
+        if self.refresh_interval is not None:
+            parameters.append(f"refresh_interval = {self.refresh_interval}")
+        if self.codec is not None:
+            parameters.append(f"codec = '{self.codec}'")
+        if parameters:
+            clauses.append(f"WITH ({', '.join(parameters)})")
+        return " ".join(clauses)
+
+
+def _boolean(value: t.Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in ("true", "yes", "1"):
+        return True
+    if str(value).lower() in ("false", "no", "0"):
+        return False
+    raise ValueError(f"Invalid boolean value: {value}")
+
+
+_TYPES: t.Dict[str, t.Callable[[t.Any], t.Any]] = {
+    "clustered_by": str,
+    "shards": int,
+    "shards_per_node": float,
+    "replicas": str,
+    "refresh_interval": int,
+    "codec": str,
+    "partition_by": str,
+    "ttl_days": int,
+    "large_values": _boolean,
+    "natural_key": _boolean,
+}
+
+
+# Built-in profiles: Spread large, append-heavy tables across the cluster and compress them,
+# and keep tiny configuration tables on a single shard. Route rows of run-scoped tables by
+# `run_uuid`, so reading metrics, params, or tags of a single run only hits a single shard.
+DEFAULT_PROFILES: t.Dict[str, StorageProfile] = {
+    "latest_metrics": StorageProfile(clustered_by="run_uuid"),
+    "metrics": StorageProfile(clustered_by="run_uuid", shards_per_node=4, codec="best_compression"),
+    "params": StorageProfile(clustered_by="run_uuid"),
+    "spans": StorageProfile(shards_per_node=4, codec="best_compression"),
+    "tags": StorageProfile(clustered_by="run_uuid"),
+    "webhooks": StorageProfile(shards=1),
+    "webhook_events": StorageProfile(shards=1),
+    "workspaces": StorageProfile(shards=1),
+}
+
+
+class StorageProfiles:
+    """
+    Storage profiles of all tables of a database.
+    """
+
+    def __init__(self, profiles: t.Optional[t.Dict[str, StorageProfile]] = None):
+        self.profiles = dict(DEFAULT_PROFILES)
+        for table, profile in (profiles or {}).items():
+            self.profiles[table] = self.profiles.get(table, StorageProfile()).merge(profile)
+
+    @classmethod
+    def from_url(cls, url: sa.URL) -> "StorageProfiles":
+        """
+        Derive profiles from a file referenced by the `storage_profiles` URI query parameter,
+        or the `MLFLOW_CRATEDB_STORAGE_PROFILES` environment variable, and from URI query
+        parameters like `storage.metrics.shards=12`.
+        """
+        from mlflow_cratedb.environment_variables import MLFLOW_CRATEDB_STORAGE_PROFILES
+
+        settings: t.Dict[str, t.Dict[str, t.Any]] = {}
+        path = url.query.get(URI_PARAMETER_FILE) or MLFLOW_CRATEDB_STORAGE_PROFILES.get()
+        if path:
+            settings = load_profiles_file(str(path))
+        for key, value in url.query.items():
+            if key.startswith(URI_PARAMETER_PREFIX):
+                table, _, name = key[len(URI_PARAMETER_PREFIX) :].rpartition(".")
+                if not table or not name:
+                    raise ValueError(f"Invalid storage parameter: {key}. Use `storage.<table>.<setting>`")
+                settings.setdefault(table, {})[name] = value if isinstance(value, str) else value[-1]
+        return cls({table: StorageProfile.from_dict(values) for table, values in settings.items()})
+
+    def get(self, table: str) -> StorageProfile:
+        profile = self.profiles.get(ALL_TABLES, StorageProfile())
+        return profile.merge(self.profiles.get(table, StorageProfile()))
+
+    def partitioned_tables(self) -> t.Set[str]:
+        return {table for table in TIME_COLUMNS if self.get(table).partition_by is not None}
+
+    def natural_key_tables(self) -> t.Set[str]:
+        return {table for table in NATURAL_KEYS if self.get(table).natural_key}
+
+    def fingerprint(self) -> str:
+        """
+        Identify the effective profiles, so changing them causes provisioning to run again.
+        """
+        payload = {table: dataclasses.asdict(profile) for table, profile in sorted(self.profiles.items())}
+        return hashlib.sha256(json.dumps(payload).encode("utf-8")).hexdigest()
+
+    def render(self, table: str, statement: str, nodes: int) -> str:
+        """
+        Apply the profile of a table to its `CREATE TABLE` statement.
+        """
+        profile = self.get(table)
+        clauses = profile.render(nodes)
+        if profile.large_values and table in LARGE_VALUE_COLUMNS:
+            statement = large_values_statement(table, statement)
+        if profile.natural_key and table in NATURAL_KEYS:
+            statement = natural_key_statement(table, statement)
+        if not clauses:
+            return statement
+        statement = statement.rstrip().rstrip(";")
+        if profile.partition_by is not None:
+            statement = partition_statement(table, statement, profile.partition_by)
+        return f"{statement} {clauses};"
+
+
+def partition_statement(table: str, statement: str, unit: str) -> str:
+    """
+    Add the generated partition column to the column list of a `CREATE TABLE` statement.
+    When the table has a primary key, it must include the partition column.
+    """
+    if table not in TIME_COLUMNS:
+        raise ValueError(f"Table can not be partitioned: {table}. Use one of: {', '.join(TIME_COLUMNS)}")
+    if unit not in PARTITION_UNITS:
+        raise ValueError(f"Invalid partition unit: {unit}. Use one of: {', '.join(PARTITION_UNITS)}")
+    column = (
+        f'"{PARTITION_COLUMN}" TIMESTAMP WITH TIME ZONE '
+        f"GENERATED ALWAYS AS date_trunc('{unit}', {TIME_COLUMNS[table]})"
+    )
+    statement = re.sub(r"(PRIMARY KEY \([^)]*)\)", rf'\1, "{PARTITION_COLUMN}")', statement)
+    head, _, tail = statement.rpartition(")")
+    return f"{head.rstrip()},\n\t{column}\n){tail}"
+
+
+def large_values_statement(table: str, statement: str) -> str:
+    """
+    Disable the index and the column store of the large-value columns of a `CREATE TABLE` statement.
+    """
+    for column in LARGE_VALUE_COLUMNS[table]:
+        pattern = rf'^(\s*"?{re.escape(column)}"?\s+TEXT\b[^,\n]*?)(\s*(?:,|--|$))'
+        statement, count = re.subn(pattern, rf"\1 {LARGE_VALUE_OPTIONS}\2", statement, count=1, flags=re.MULTILINE)
+        if not count:
+            raise ValueError(f"Large-value column not found: {table}.{column}")
+    return statement
+
+
+def natural_key_statement(table: str, statement: str) -> str:
+    """
+    Add the natural primary key to a `CREATE TABLE` statement.
+    """
+    if "PRIMARY KEY" in statement:
+        raise ValueError(f"Table already has a primary key: {table}")
+    columns = ", ".join(f'"{column}"' for column in NATURAL_KEYS[table])
+    head, _, tail = statement.rpartition(")")
+    return f"{head.rstrip()},\n\tPRIMARY KEY ({columns})\n){tail}"
+
+
+def load_profiles_file(path: str) -> t.Dict[str, t.Dict[str, t.Any]]:
+    """
+    Read storage profiles from a YAML or JSON file.
+    """
+    import yaml
+
+    with open(path) as f:
+        settings = yaml.safe_load(f) or {}
+    if not isinstance(settings, dict) or not all(isinstance(value, dict) for value in settings.values()):
+        raise ValueError(f"Invalid storage profiles file: {path}. Expected a mapping of table names to settings")
+    return settings
+
+
+def uri_parameters(url: sa.URL) -> t.List[str]:
+    """
+    Return the query parameters of a `crate://` URI which define storage profiles.
+    """
+    return [key for key in url.query if key == URI_PARAMETER_FILE or key.startswith(URI_PARAMETER_PREFIX)]
+
+
+def count_nodes(connection) -> int:
+    return connection.execute(sa.text("SELECT COUNT(*) FROM sys.nodes")).scalar() or 1
+
+
+_profiles: "weakref.WeakKeyDictionary[sa.Engine, StorageProfiles]" = weakref.WeakKeyDictionary()
+
+
+def set_storage_profiles(engine: sa.Engine, profiles: StorageProfiles):
+    _profiles[engine] = profiles
+
+
+def get_storage_profiles(engine: sa.Engine) -> StorageProfiles:
+    """
+    Return the storage profiles of an engine, defaulting to the environment configuration.
+    """
+    profiles = _profiles.get(engine)
+    if profiles is None:
+        profiles = StorageProfiles.from_url(engine.url)
+        set_storage_profiles(engine, profiles)
+    return profiles
@@ -0,0 +1,162 @@
+"""
+Enforce emulated UNIQUE constraints atomically, using shadow primary keys.
+
+Each combination of values of a constraint is claimed by inserting a row into the
+`unique_keys` table, using a hash of the table name, the constraint name, and the
+values as primary key. CrateDB rejects duplicate primary keys atomically, and looks
+them up in real time, so concurrent writers can not both pass the check, and no
+`REFRESH TABLE` is needed beforehand.
+
+CrateDB does not permit table names starting with an underscore, so the table is
+called `unique_keys`.
+"""
+
+import hashlib
+import json
+import threading
+import time
+import typing as t
+import weakref
+from enum import Enum
+
+import sqlalchemy as sa
+
+TABLE_NAME = "unique_keys"
+
+DDL = f"""
+CREATE TABLE IF NOT EXISTS "{TABLE_NAME}" (
+    key TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    constraint_name TEXT NOT NULL,
+    claimed_at BIGINT NOT NULL,
+    PRIMARY KEY (key)
+)
+"""
+
+# Number of keys claimed by a single statement.
+CHUNK_SIZE = 500
+
+# Claims older than this, without a corresponding row, are considered stale, for example
+# when rows have been deleted in bulk. Younger claims may belong to an in-flight insert.
+STALE_CLAIM_MS = 60_000
+
+
+class UniquenessMode(str, Enum):
+    """
+    Define how emulated UNIQUE constraints are enforced.
+
+    - query:       Look up existing rows using a query before inserting new ones.
+    - shadow-keys: Claim shadow primary keys in the `unique_keys` table, atomically.
+    """
+
+    QUERY = "query"
+    SHADOW_KEYS = "shadow-keys"
+
+    @classmethod
+    def parse(cls, value: str) -> "UniquenessMode":
+        try:
+            return cls(value.lower())
+        except ValueError as ex:
+            modes = ", ".join(mode.value for mode in cls)
+            raise ValueError(f"Invalid uniqueness mode: {value}. Use one of: {modes}") from ex
+
+
+def get_uniqueness_mode() -> UniquenessMode:
+    """
+    Return the uniqueness mode, as configured by `MLFLOW_CRATEDB_UNIQUENESS`.
+    """
+    from mlflow_cratedb.environment_variables import MLFLOW_CRATEDB_UNIQUENESS
+
+    return UniquenessMode.parse(MLFLOW_CRATEDB_UNIQUENESS.get())
+
+
+def unique_key(table: str, constraint_name: str, values: t.Sequence[t.Any]) -> str:
+    """
+    Compute the shadow primary key for a combination of values of a constraint.
+    """
+    payload = json.dumps([table, constraint_name, list(values)], default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def claim_unique_keys(connection, table: str, constraint_name: str, keys: t.Iterable[str]) -> t.Set[str]:
+    """
+    Claim shadow keys, and return those which have been claimed before.
+    """
+    keys = list(keys)
+    conflicts = set()
+    for offset in range(0, len(keys), CHUNK_SIZE):
+        chunk = keys[offset : offset + CHUNK_SIZE]
+        params: t.Dict[str, t.Any] = {"table_name": table, "constraint_name": constraint_name, "claimed_at": _now_ms()}
+        placeholders = []
+        for index, key in enumerate(chunk):
+            params[f"key_{index}"] = key
+            placeholders.append(f"(:key_{index}, :table_name, :constraint_name, :claimed_at)")
+        sql = (
+            f'INSERT INTO "{TABLE_NAME}" (key, table_name, constraint_name, claimed_at) '  # noqa: S608
+            f"VALUES {', '.join(placeholders)} ON CONFLICT DO NOTHING RETURNING key"
+        )
+        claimed = {row[0] for row in connection.execute(sa.text(sql), params)}
+        conflicts.update(set(chunk) - claimed)
+    return conflicts
+
+
+def reclaim_unique_keys(connection, table: str, constraint_name: str, keys: t.Iterable[str]) -> t.Set[str]:
+    """
+    Claim shadow keys which have been claimed before, if their claims are stale, and return the reclaimed keys.
+
+    The caller is responsible for verifying that no corresponding rows exist.
+    """
+    keys = list(keys)
+    if not keys:
+        return set()
+    connection.execute(
+        sa.text(f'DELETE FROM "{TABLE_NAME}" WHERE key = ANY(:keys) AND claimed_at < :threshold'),  # noqa: S608
+        {"keys": keys, "threshold": _now_ms() - STALE_CLAIM_MS},
+    )
+    return set(keys) - claim_unique_keys(connection, table, constraint_name, keys)
+
+
+def release_unique_keys(connection, keys: t.Iterable[str]):
+    """
+    Release shadow keys, for example after deleting or renaming rows.
+    """
+    keys = list(keys)
+    for offset in range(0, len(keys), CHUNK_SIZE):
+        connection.execute(
+            sa.text(f'DELETE FROM "{TABLE_NAME}" WHERE key = ANY(:keys)'),  # noqa: S608
+            {"keys": keys[offset : offset + CHUNK_SIZE]},
+        )
+
+
+# Engines whose database has been provisioned with the `unique_keys` table.
+_provisioned: "weakref.WeakSet[sa.Engine]" = weakref.WeakSet()
+_provisioned_lock = threading.Lock()
+
+
+def provision_unique_keys(connection, backfill: t.Callable[[t.Any], None]):
+    """
+    Create the `unique_keys` table once per database, and claim the keys of all existing
+    rows using the `backfill` callback, when the table has been created.
+    """
+    engine = connection.engine
+    if engine in _provisioned:
+        return
+    with _provisioned_lock:
+        if engine in _provisioned:
+            return
+        if not sa.inspect(connection).has_table(TABLE_NAME):
+            connection.execute(sa.text(DDL))
+            backfill(connection)
+        _provisioned.add(engine)
+
+
+def forget_provisioned():
+    """
+    Forget which databases have been provisioned, for example after dropping tables.
+    """
+    with _provisioned_lock:
+        _provisioned.clear()
@@ -0,0 +1,94 @@
+"""
+Remember which value combinations of emulated UNIQUE constraints exist, per database.
+
+Only existing value combinations are remembered, so the cache can reject inserts
+without a database round trip, but never accept them. Entries are updated when rows
+are inserted, renamed, or deleted through the ORM in the current process, and expire
+after a while, because other processes may modify the same tables.
+"""
+
+import functools
+import threading
+import time
+import typing as t
+from collections import OrderedDict
+
+CacheKey = t.Tuple[str, str, str, t.Tuple[t.Any, ...]]
+
+
+class UniquenessCache:
+    """
+    Thread-safe LRU cache of confirmed-existing unique keys.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl_ms: int = 10_000):
+        self.maxsize = maxsize
+        self.ttl = ttl_ms / 1000
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[CacheKey, float]" = OrderedDict()
+
+    def contains(self, database: str, table: str, constraint_name: str, values: t.Tuple[t.Any, ...]) -> bool:
+        """
+        Return whether a value combination is known to exist.
+        """
+        if not self._entries:
+            return False
+        key = (database, table, constraint_name, values)
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is None:
+                return False
+            if expires < time.monotonic():
+                del self._entries[key]
+                return False
+            self._entries.move_to_end(key)
+            return True
+
+    def add(self, database: str, table: str, constraint_name: str, values: t.Tuple[t.Any, ...]):
+        """
+        Remember a value combination which exists.
+        """
+        if not self.maxsize:
+            return
+        key = (database, table, constraint_name, values)
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, database: str, table: str, constraint_name: str, values: t.Tuple[t.Any, ...]):
+        """
+        Forget a value combination, for example after deleting or renaming its row.
+        """
+        with self._lock:
+            self._entries.pop((database, table, constraint_name, values), None)
+
+    def invalidate(self, table: str):
+        """
+        Forget all entries of a table, for example after deleting or updating rows in bulk.
+        """
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == table]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+@functools.cache
+def get_uniqueness_cache() -> UniquenessCache:
+    """
+    Return the uniqueness cache, as configured by `MLFLOW_CRATEDB_UNIQUENESS_CACHE_SIZE`
+    and `MLFLOW_CRATEDB_UNIQUENESS_CACHE_TTL_MS`.
+    """
+    from mlflow_cratedb.environment_variables import (
+        MLFLOW_CRATEDB_UNIQUENESS_CACHE_SIZE,
+        MLFLOW_CRATEDB_UNIQUENESS_CACHE_TTL_MS,
+    )
+
+    return UniquenessCache(
+        maxsize=MLFLOW_CRATEDB_UNIQUENESS_CACHE_SIZE.get(),
+        ttl_ms=MLFLOW_CRATEDB_UNIQUENESS_CACHE_TTL_MS.get(),
+    )
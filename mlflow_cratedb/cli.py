@@ -1,4 +1,5 @@
 import importlib.metadata
+import typing as t
 
 import click
 
@@ -8,7 +9,73 @@ from mlflow.cli import cli  # noqa: F401
 app_version = importlib.metadata.version("mlflow-cratedb")
 
 
-@cli.command("cratedb")
+@cli.group("cratedb", invoke_without_command=True)
 @click.version_option(version=app_version)
 def cratedb():
     pass
+
+
+@cratedb.command("retention")
+@click.option(
+    "--backend-store-uri",
+    envvar="MLFLOW_TRACKING_URI",
+    required=True,
+    help="URI of the CrateDB database, like `crate://crate@localhost/?schema=mlflow`.",
+)
+@click.option(
+    "--table",
+    "tables",
+    multiple=True,
+    help="Table partitioned by time. Can be used multiple times. Default: All tables partitioned by time.",
+)
+@click.option(
+    "--older-than",
+    type=int,
+    help="Drop data older than this number of days. Default: The `ttl_days` setting of the storage profile.",
+)
+def retention(backend_store_uri: str, tables: tuple, older_than: t.Optional[int]):
+    """
+    Drop partitions of tables partitioned by time, which only contain expired data.
+    """
+    from mlflow.store.db.utils import create_sqlalchemy_engine
+
+    from mlflow_cratedb.adapter.retention import purge_expired
+
+    engine = create_sqlalchemy_engine(backend_store_uri)
+    for table, count in purge_expired(engine, tables or None, older_than).items():
+        if count is None:
+            click.echo(f"Skipped table {table}, because it has no time to live")
+        else:
+            click.echo(f"Dropped {count} partitions of table {table}")
+
+
+@cratedb.command("purge")
+@click.option(
+    "--backend-store-uri",
+    envvar="MLFLOW_TRACKING_URI",
+    required=True,
+    help="URI of the CrateDB database, like `crate://crate@localhost/?schema=mlflow`.",
+)
+@click.option(
+    "--experiment-id",
+    "experiment_ids",
+    type=int,
+    multiple=True,
+    help="Identifier of the experiment to purge. Can be used multiple times.",
+)
+@click.option("--workspace", help="Name of the workspace to purge, including all of its experiments.")
+@click.confirmation_option(prompt="Purged data can not be restored. Continue?")
+def purge(backend_store_uri: str, experiment_ids: tuple, workspace: t.Optional[str]):
+    """
+    Permanently delete experiments or a workspace, including their runs and traces.
+    """
+    from mlflow.store.db.utils import create_sqlalchemy_engine
+
+    from mlflow_cratedb.adapter.purge import purge_experiments
+
+    if bool(experiment_ids) == bool(workspace):
+        raise click.UsageError("Use either `--experiment-id` or `--workspace`")
+    engine = create_sqlalchemy_engine(backend_store_uri)
+    outcome = purge_experiments(engine, list(experiment_ids) or None, workspace)
+    for table, count in outcome.items():
+        click.echo(f"Deleted {count} rows of table {table}")
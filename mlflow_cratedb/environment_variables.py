@@ -0,0 +1,48 @@
+"""
+This module defines environment variables used by the MLflow adapter for CrateDB.
+Their names begin with `MLFLOW_CRATEDB_`.
+"""
+
+from mlflow.environment_variables import _EnvironmentVariable
+
+#: Specifies how data written through the ORM is synchronized using `REFRESH TABLE`.
+#: One of `strict`, `per-commit`, `debounced`, `on-read`, or `none`. The `consistency`
+#: query parameter of a `crate://` URI takes precedence. (default: ``strict``)
+MLFLOW_CRATEDB_CONSISTENCY = _EnvironmentVariable("MLFLOW_CRATEDB_CONSISTENCY", str, "strict")
+
+#: Specifies the maximum number of milliseconds modified tables may stay unrefreshed
+#: when using the `debounced` consistency mode. The `max_staleness_ms` query parameter
+#: of a `crate://` URI takes precedence. (default: ``1000``)
+MLFLOW_CRATEDB_MAX_STALENESS_MS = _EnvironmentVariable("MLFLOW_CRATEDB_MAX_STALENESS_MS", int, 1000)
+
+#: Specifies the number of milliseconds the `debounced` consistency mode waits for further
+#: writes, in order to merge them into a single refresh, and the minimum spacing between
+#: two refreshes. The `refresh_interval_ms` query parameter of a `crate://` URI takes
+#: precedence. (default: ``100``)
+MLFLOW_CRATEDB_REFRESH_INTERVAL_MS = _EnvironmentVariable("MLFLOW_CRATEDB_REFRESH_INTERVAL_MS", int, 100)
+
+#: Specifies the scope of the registry of dirty tables used by the `on-read` consistency mode.
+#: Use `shared` to share it across all processes on the same host, for example multiple
+#: workers of the MLflow server, or `process` to keep it private to each process.
+#: (default: ``shared``)
+MLFLOW_CRATEDB_DIRTY_TABLES = _EnvironmentVariable("MLFLOW_CRATEDB_DIRTY_TABLES", str, "shared")
+
+#: Specifies how emulated UNIQUE constraints are enforced. Use `query` to look up existing
+#: rows before inserting new ones, or `shadow-keys` to claim shadow primary keys in the
+#: `unique_keys` table, which is atomic across concurrent writers. (default: ``query``)
+MLFLOW_CRATEDB_UNIQUENESS = _EnvironmentVariable("MLFLOW_CRATEDB_UNIQUENESS", str, "query")
+
+#: Specifies the maximum number of unique value combinations, like experiment names, whose
+#: existence is remembered per process, in order to reject duplicate inserts without a
+#: database round trip. Use ``0`` to turn the cache off. (default: ``1024``)
+MLFLOW_CRATEDB_UNIQUENESS_CACHE_SIZE = _EnvironmentVariable("MLFLOW_CRATEDB_UNIQUENESS_CACHE_SIZE", int, 1024)
+
+#: Specifies the number of milliseconds entries of the uniqueness cache stay valid, bounding
+#: how long changes made by other processes may go unnoticed. (default: ``10000``)
+MLFLOW_CRATEDB_UNIQUENESS_CACHE_TTL_MS = _EnvironmentVariable("MLFLOW_CRATEDB_UNIQUENESS_CACHE_TTL_MS", int, 10_000)
+
+#: Specifies the path to a YAML or JSON file defining storage profiles per table, like
+#: the number of shards, replicas, the refresh interval, and the compression codec,
+#: applied when creating tables. The `storage_profiles` query parameter of a `crate://`
+#: URI takes precedence. (default: ``None``)
+MLFLOW_CRATEDB_STORAGE_PROFILES = _EnvironmentVariable("MLFLOW_CRATEDB_STORAGE_PROFILES", str, None)
@@ -3,6 +3,17 @@ import functools
 import sqlalchemy as sa
 from mlflow.store.db.utils import create_sqlalchemy_engine as create_sqlalchemy_engine_dist
 
+from mlflow_cratedb.adapter.cluster import DEFAULT_PROBE_INTERVAL_MS, enable_load_balancing, split_servers
+from mlflow_cratedb.adapter.cluster import URI_PARAMETERS as CLUSTER_URI_PARAMETERS
+from mlflow_cratedb.adapter.idempotency import enable_idempotent_inserts
+from mlflow_cratedb.adapter.refresh import URI_PARAMETERS as REFRESH_URI_PARAMETERS
+from mlflow_cratedb.adapter.refresh import RefreshPolicy, set_refresh_policy
+from mlflow_cratedb.adapter.registry import get_shared_engine
+from mlflow_cratedb.adapter.session import SessionSettings, enable_session_settings
+from mlflow_cratedb.adapter.session import uri_parameters as session_uri_parameters
+from mlflow_cratedb.adapter.storage import StorageProfiles, set_storage_profiles
+from mlflow_cratedb.adapter.storage import uri_parameters as storage_uri_parameters
+
 
 def patch_db_utils():
     import mlflow.store.db.utils as db_utils
@@ -14,18 +25,46 @@ def patch_db_utils():
 
 def create_sqlalchemy_engine(db_uri):
     """
-    Relax OBJECT(DYNAMIC) attribute access behaviour where attribute does not exist yet.
+    Share a single engine per database URI across all MLflow stores of the process,
+    see `mlflow_cratedb.adapter.registry`.
+    """
+    return get_shared_engine(db_uri, _create_sqlalchemy_engine)
+
 
-    Example: SELECT spans.dimension_attributes['mlflow.llm.model']
-    Error:   Column dimension_attributes['mlflow.llm.model'] unknown
+def _create_sqlalchemy_engine(db_uri):
     """
-    engine = create_sqlalchemy_engine_dist(db_uri)
+    Apply session settings to database connections, see `mlflow_cratedb.adapter.session`.
 
-    def receive_engine_connect(conn):
-        conn.execute(sa.text("SET error_on_unknown_object_key=false;"))
-        conn.commit()
+    Spread connections across multiple hosts, when the URI lists them, see
+    `mlflow_cratedb.adapter.cluster`.
 
-    sa.event.listen(engine, "engine_connect", receive_engine_connect)
+    Also, consume the adapter's own URI query parameters like `consistency`,
+    `storage.metrics.shards`, or `session.<setting>`, which must not be propagated
+    to the database driver.
+    """
+    db_uri, servers = split_servers(db_uri)
+    url = sa.make_url(db_uri)
+    if servers and url.drivername != "crate":
+        raise ValueError(f"Multiple hosts are only supported by the `crate://` dialect, not `{url.drivername}://`")
+    refresh_policy = RefreshPolicy.from_url(url)
+    storage_profiles = StorageProfiles.from_url(url)
+    session_settings = SessionSettings.from_url(url)
+    probe_interval_ms = int(str(url.query.get("probe_interval_ms", DEFAULT_PROBE_INTERVAL_MS)))
+    url = url.difference_update_query(
+        [
+            *REFRESH_URI_PARAMETERS,
+            *CLUSTER_URI_PARAMETERS,
+            *storage_uri_parameters(url),
+            *session_uri_parameters(url),
+        ]
+    )
+    engine = create_sqlalchemy_engine_dist(url.render_as_string(hide_password=False))
+    if servers:
+        enable_load_balancing(engine, servers, probe_interval_ms)
+    set_storage_profiles(engine, storage_profiles)
+    set_refresh_policy(engine, refresh_policy)
+    enable_idempotent_inserts(engine)
+    enable_session_settings(engine, session_settings)
 
     return engine
 
@@ -35,6 +74,8 @@ def _initialize_tables(engine: sa.Engine):
     """
     Skip SQLAlchemy schema provisioning and Alembic migrations.
     Both don't play well with CrateDB.
+
+    Because engines are shared per database URI, all stores share the outcome.
     """
     from mlflow.store.db.utils import _logger
 
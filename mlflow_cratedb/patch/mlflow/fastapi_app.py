@@ -0,0 +1,375 @@
+"""
+Serve the endpoints used by logging clients natively on MLflow's FastAPI application,
+using the asynchronous tracking store, see `mlflow_cratedb.adapter.async_store`.
+
+Requests are validated using the schemas of MLflow's request handlers. The middleware of
+the FastAPI application applies to them, but request hooks of the Flask application do
+not. So, while authentication, workspaces, or other request hooks are enabled, all
+endpoints are served by the Flask application. This is checked on each request, because
+plugins may register request hooks after the routes have been registered.
+"""
+
+import asyncio
+import json
+import logging
+import re
+import types
+import typing as t
+
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Match, Route
+
+if t.TYPE_CHECKING:
+    from mlflow.store.tracking.sqlalchemy_store import SqlAlchemyStore
+
+    from mlflow_cratedb.adapter.async_store import AsyncTrackingStore
+
+logger = logging.getLogger(__name__)
+
+# Modules of the request hooks which MLflow registers on its Flask application by default.
+# The middleware of its FastAPI application does the same for all routes.
+DEFAULT_HOOK_MODULES = ("mlflow.server.security", "mlflow.server.workspace_helpers")
+
+JSON = "application/json"
+
+
+def register_async_routes(app):
+    """
+    Serve the endpoints used by logging clients natively on the FastAPI application, using
+    the asynchronous tracking store, when the backend store uses the `crate+psycopg://` dialect.
+    All other endpoints continue to be served by the mounted Flask application.
+    See `mlflow_cratedb.adapter.async_store`.
+    """
+    import os
+
+    from mlflow.protos.service_pb2 import MlflowService
+    from mlflow.server import ARTIFACTS_ONLY_ENV_VAR, BACKEND_STORE_URI_ENV_VAR
+    from mlflow.server.handlers import get_endpoints, get_service_endpoints
+
+    from mlflow_cratedb.adapter.async_store import supports_async
+
+    if os.environ.get(ARTIFACTS_ONLY_ENV_VAR) or not supports_async(os.environ.get(BACKEND_STORE_URI_ENV_VAR)):
+        return
+    reason = _flask_only_reason()
+    if reason:
+        logger.info(f"Serving all endpoints through the Flask application, because {reason}")
+
+    handlers = _async_handlers()
+    schemas = _request_schemas(handlers)
+    static_paths = [path for path, _, _ in get_endpoints() if "<" not in path]
+    routes = []
+    for path, request_class, methods in get_service_endpoints(MlflowService, lambda request_class: request_class):
+        if request_class in handlers and request_class in schemas:
+            route = _AsyncRoute(
+                re.sub(r"<(\w+)>", r"{\1}", path),
+                _async_endpoint(request_class, handlers[request_class], schemas[request_class]),
+                methods=methods,
+            )
+            # Like Flask, prefer static paths of other endpoints, like `/mlflow/traces/get`.
+            route.excluded = {static for static in static_paths if static != path and route.path_regex.match(static)}
+            routes.append(route)
+
+    # Routes must precede the Flask application, which is mounted at the root path.
+    app.router.routes[0:0] = routes
+
+
+def _flask_only_reason() -> t.Optional[str]:
+    """
+    Why endpoints must be served by the Flask application, because its request hooks,
+    like authentication, would be bypassed otherwise. Return `None` when they need not.
+    """
+    from mlflow.environment_variables import MLFLOW_ENABLE_WORKSPACES
+    from mlflow.server import app as flask_app
+
+    if MLFLOW_ENABLE_WORKSPACES.get():
+        return "workspaces are enabled"
+    for hooks in (flask_app.before_request_funcs, flask_app.after_request_funcs):
+        for hook in (hook for functions in hooks.values() for hook in functions):
+            if getattr(hook, "__module__", None) not in DEFAULT_HOOK_MODULES:
+                return f"request hook {hook.__module__}.{hook.__qualname__} is enabled"
+    return None
+
+
+class _AsyncRoute(Route):
+    """
+    Route which does not match the given paths, or any path while endpoints must be served
+    by the Flask application, so they are served by the Flask application.
+    """
+
+    excluded: t.Set[str] = set()
+
+    def matches(self, scope):
+        if scope["type"] == "http" and (scope["path"] in self.excluded or _flask_only_reason()):
+            return Match.NONE, {}
+        return super().matches(scope)
+
+
+_async_store: "t.Optional[AsyncTrackingStore]" = None
+_async_store_lock = asyncio.Lock()
+
+
+async def get_async_tracking_store() -> "AsyncTrackingStore":
+    """
+    Return the asynchronous variant of the server's tracking store, creating it on first use.
+    The synchronous store is created first, in a worker thread, because it provisions the database.
+    """
+    global _async_store
+    if _async_store is None:
+        async with _async_store_lock:
+            if _async_store is None:
+                from mlflow.server.handlers import _get_tracking_store
+
+                from mlflow_cratedb.adapter.async_store import AsyncTrackingStore
+                from mlflow_cratedb.adapter.unique_keys import (
+                    UniquenessMode,
+                    get_uniqueness_mode,
+                    provision_unique_keys,
+                )
+                from mlflow_cratedb.patch.mlflow.model import backfill_unique_keys
+
+                store = AsyncTrackingStore(t.cast("SqlAlchemyStore", await asyncio.to_thread(_get_tracking_store)))
+
+                # Provisioning holds a thread lock, which must not be contended on the event loop.
+                def provision():
+                    with store.engine.connect() as connection:
+                        provision_unique_keys(connection, backfill_unique_keys)
+                        connection.commit()
+
+                if get_uniqueness_mode() is UniquenessMode.SHADOW_KEYS:
+                    await store.run_sync(provision)
+                _async_store = store
+    return _async_store
+
+
+def _async_endpoint(request_class, handler, schema: t.Optional[t.Dict[str, t.List[t.Callable]]] = None):
+    """
+    Wrap an asynchronous request handler, converting protobuf messages from and to JSON.
+    """
+    from mlflow.exceptions import MlflowException
+    from mlflow.utils.proto_json_utils import message_to_json
+
+    async def endpoint(request: Request) -> Response:
+        try:
+            request_message = await _get_request_message(request, request_class(), schema)
+            response_message = await handler(await get_async_tracking_store(), request_message)
+        except MlflowException as ex:
+            return Response(ex.serialize_as_json(), status_code=ex.get_http_status_code(), media_type=JSON)
+        return Response(message_to_json(response_message), media_type=JSON)
+
+    return endpoint
+
+
+async def _get_request_message(request: Request, request_message, schema=None):
+    """
+    Parse query parameters, or the JSON body, and path parameters, into a protobuf message,
+    and validate them against the schema of MLflow's request handler.
+    """
+    from google.protobuf.descriptor import FieldDescriptor
+    from google.protobuf.json_format import ParseError
+    from mlflow.exceptions import MlflowException
+    from mlflow.protos.service_pb2 import LogBatch
+    from mlflow.server.handlers import _validate_request_json_with_schema
+    from mlflow.server.validation import _validate_content_type
+    from mlflow.utils.proto_json_utils import parse_dict
+    from mlflow.utils.validation import _validate_batch_log_api_req
+
+    request_json: t.Dict[str, t.Any] = {}
+    if request.method == "GET":
+        for field in request_message.DESCRIPTOR.fields:
+            values = request.query_params.getlist(field.name)
+            if not values:
+                continue
+            try:
+                is_repeated = field.is_repeated
+            except AttributeError:
+                is_repeated = field.label == FieldDescriptor.LABEL_REPEATED
+            if is_repeated:
+                request_json[field.name] = values
+            elif field.type == FieldDescriptor.TYPE_BOOL:
+                if values[0].lower() not in ("true", "false"):
+                    raise MlflowException.invalid_parameter_value(
+                        f"Invalid boolean value: {values[0]}, must be 'true' or 'false'."
+                    )
+                request_json[field.name] = values[0].lower() == "true"
+            else:
+                request_json[field.name] = values[0]
+    else:
+        _validate_content_type(
+            types.SimpleNamespace(method=request.method, content_type=request.headers.get("content-type")), [JSON]
+        )
+        body = await request.body()
+        if isinstance(request_message, LogBatch):
+            _validate_batch_log_api_req(body)
+        try:
+            request_json = json.loads(body) if body else {}
+            # Older clients post their JSON double-encoded as strings.
+            if isinstance(request_json, str):
+                request_json = json.loads(request_json)
+        except ValueError as ex:
+            raise MlflowException.invalid_parameter_value(f"Invalid JSON in request body: {ex}") from ex
+    request_json.update(request.path_params)
+    parse_error = None
+    try:
+        parse_dict(request_json, request_message)
+    except ParseError as ex:
+        parse_error = ex
+    _validate_request_json_with_schema(request_json, schema, parse_error is None)
+    if parse_error is not None:
+        raise MlflowException.invalid_parameter_value(f"Invalid request: {parse_error}") from parse_error
+    return request_message
+
+
+class _SchemaCaptured(Exception):
+    """
+    Raised instead of parsing a request, to capture the schema of a request handler.
+    """
+
+    def __init__(self, schema: t.Optional[t.Dict[str, t.List[t.Callable]]]):
+        super().__init__()
+        self.schema = schema
+
+
+def _request_schemas(request_classes: t.Iterable[type]) -> t.Dict[type, t.Optional[t.Dict[str, t.List[t.Callable]]]]:
+    """
+    Validation schemas of the requests, captured from the request handlers of `mlflow.server.handlers`,
+    by invoking them up to the point where they parse their request, or access the tracking store.
+    Requests whose handlers do not get that far are omitted, so they are served by the Flask application.
+    """
+    import inspect
+
+    from mlflow.server import app as flask_app
+    from mlflow.server import handlers
+
+    def capture_schema(request_message, flask_request=None, schema=None):
+        raise _SchemaCaptured(schema)
+
+    def capture_no_schema(*args, **kwargs):
+        raise _SchemaCaptured(None)
+
+    schemas = {}
+    get_request_message, get_tracking_store = handlers._get_request_message, handlers._get_tracking_store
+    handlers._get_request_message, handlers._get_tracking_store = capture_schema, capture_no_schema
+    try:
+        with flask_app.test_request_context(method="POST", json={}):
+            for request_class in request_classes:
+                handler = handlers.HANDLERS.get(request_class)
+                if handler is None:
+                    continue
+                try:
+                    handler(*["" for _ in inspect.signature(handler).parameters])
+                except _SchemaCaptured as captured:
+                    schemas[request_class] = captured.schema
+                except Exception:
+                    logger.debug(f"Failed to capture the schema of {request_class.__name__}", exc_info=True)
+                if request_class not in schemas:
+                    logger.warning(f"Serving {request_class.__name__} through the Flask application, schema unknown")
+    finally:
+        handlers._get_request_message, handlers._get_tracking_store = get_request_message, get_tracking_store
+    return schemas
+
+
+def _async_handlers() -> t.Dict[type, t.Callable[["AsyncTrackingStore", t.Any], t.Awaitable[t.Any]]]:
+    """
+    Asynchronous request handlers, mirroring the ones of `mlflow.server.handlers`.
+    """
+    from mlflow.entities import Metric, Param, RunTag, TraceInfo, ViewType
+    from mlflow.protos.service_pb2 import (
+        DeleteTraceTagV3,
+        GetMetricHistory,
+        GetRun,
+        GetTraceInfoV3,
+        LogBatch,
+        SearchRuns,
+        SearchTracesV3,
+        SetTraceTagV3,
+        StartTraceV3,
+    )
+    from mlflow.protos.service_pb2 import Trace as ProtoTrace
+
+    async def log_batch(store, request_message):
+        await store.log_batch(
+            run_id=request_message.run_id,
+            metrics=[Metric.from_proto(metric) for metric in request_message.metrics],
+            params=[Param.from_proto(param) for param in request_message.params],
+            tags=[RunTag.from_proto(tag) for tag in request_message.tags],
+        )
+        return LogBatch.Response()
+
+    async def get_run(store, request_message):
+        run = await store.get_run(request_message.run_id or request_message.run_uuid)
+        return GetRun.Response(run=run.to_proto())
+
+    async def search_runs(store, request_message):
+        run_view_type = ViewType.ACTIVE_ONLY
+        if request_message.HasField("run_view_type"):
+            run_view_type = ViewType.from_proto(request_message.run_view_type)
+        runs = await store.search_runs(
+            experiment_ids=list(request_message.experiment_ids),
+            filter_string=request_message.filter,
+            run_view_type=run_view_type,
+            max_results=request_message.max_results,
+            order_by=list(request_message.order_by),
+            page_token=request_message.page_token or None,
+        )
+        response_message = SearchRuns.Response(runs=[run.to_proto() for run in runs])
+        if runs.token:
+            response_message.next_page_token = runs.token
+        return response_message
+
+    async def get_metric_history(store, request_message):
+        metrics = await store.get_metric_history(
+            request_message.run_id or request_message.run_uuid,
+            request_message.metric_key,
+            max_results=request_message.max_results if request_message.HasField("max_results") else None,
+            page_token=request_message.page_token or None,
+        )
+        response_message = GetMetricHistory.Response(metrics=[metric.to_proto() for metric in metrics])
+        if metrics.token:
+            response_message.next_page_token = metrics.token
+        return response_message
+
+    async def start_trace(store, request_message):
+        trace_info = await store.start_trace(TraceInfo.from_proto(request_message.trace.trace_info))
+        return StartTraceV3.Response(trace=ProtoTrace(trace_info=trace_info.to_proto()))
+
+    async def get_trace_info(store, request_message):
+        trace_info = await store.get_trace_info(request_message.trace_id)
+        return GetTraceInfoV3.Response(trace=ProtoTrace(trace_info=trace_info.to_proto()))
+
+    async def search_traces(store, request_message):
+        traces, token = await store.search_traces(
+            locations=[
+                location.mlflow_experiment.experiment_id
+                for location in request_message.locations
+                if location.HasField("mlflow_experiment")
+            ],
+            filter_string=request_message.filter,
+            max_results=request_message.max_results,
+            order_by=list(request_message.order_by),
+            page_token=request_message.page_token or None,
+        )
+        response_message = SearchTracesV3.Response(traces=[trace.to_proto() for trace in traces])
+        if token:
+            response_message.next_page_token = token
+        return response_message
+
+    async def set_trace_tag(store, request_message):
+        await store.set_trace_tag(request_message.trace_id, request_message.key, request_message.value)
+        return SetTraceTagV3.Response()
+
+    async def delete_trace_tag(store, request_message):
+        await store.delete_trace_tag(request_message.trace_id, request_message.key)
+        return DeleteTraceTagV3.Response()
+
+    return {
+        LogBatch: log_batch,
+        GetRun: get_run,
+        SearchRuns: search_runs,
+        GetMetricHistory: get_metric_history,
+        StartTraceV3: start_trace,
+        GetTraceInfoV3: get_trace_info,
+        SearchTracesV3: search_traces,
+        SetTraceTagV3: set_trace_tag,
+        DeleteTraceTagV3: delete_trace_tag,
+    }
@@ -1,11 +1,45 @@
+import typing as t
+
 import sqlalchemy as sa
 from sqlalchemy.event import listen
-from sqlalchemy_cratedb.support import check_uniqueness_factory
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
+
+from mlflow_cratedb.adapter.dirty_tables import get_dirty_tables
+from mlflow_cratedb.adapter.instrumentation import instrumentation
+from mlflow_cratedb.adapter.refresh import ConsistencyMode, database_key, get_refresh_policy, refresh_tables
+from mlflow_cratedb.adapter.unique_keys import (
+    UniquenessMode,
+    claim_unique_keys,
+    get_uniqueness_mode,
+    provision_unique_keys,
+    reclaim_unique_keys,
+    release_unique_keys,
+    unique_key,
+)
+from mlflow_cratedb.adapter.uniqueness_cache import get_uniqueness_cache
+
+# Key into `Session.info`, collecting names of tables modified within a flush.
+DIRTY_TABLES_KEY = "cratedb_dirty_tables"
+
+# Emulated UNIQUE constraints, per model class, see `polyfill_uniqueness_constraints`.
+UNIQUE_CONSTRAINTS: t.Dict[t.Any, t.List[t.Tuple[str, ...]]] = {}
+
+# Maximum number of rows validated by a single uniqueness check query.
+UNIQUENESS_CHECK_CHUNK_SIZE = 500
+
+# Keys into `Session.info`, collecting shadow keys claimed by a flush, and shadow keys of
+# deleted or renamed rows, to be released after the flush, see `mlflow_cratedb.adapter.unique_keys`.
+CLAIMED_KEYS_KEY = "cratedb_claimed_keys"
+RELEASED_KEYS_KEY = "cratedb_released_keys"
 
 
 def polyfill_uniqueness_constraints():
     """
-    Establish a manual uniqueness check on the `SqlExperiment.name` column.
+    Establish manual uniqueness checks, emulating UNIQUE constraints.
+
+    All rows pending within a session flush are validated at once, using a single
+    query per constrained model and chunk of rows, instead of one query per row.
 
     TODO: Submit patch to `crate-python`, to be enabled by a
           dialect parameter `crate_polyfill_unique` or such.
@@ -20,45 +54,306 @@ def polyfill_uniqueness_constraints():
         SqlGatewaySecret,
     )
 
-    listen(SqlGatewayEndpoint, "before_insert", check_uniqueness_factory(SqlGatewayEndpoint, "workspace", "name"))
-    listen(
-        SqlGatewayModelDefinition,
-        "before_insert",
-        check_uniqueness_factory(SqlGatewayModelDefinition, "workspace", "name"),
-    )
-    listen(SqlGatewaySecret, "before_insert", check_uniqueness_factory(SqlGatewaySecret, "workspace", "secret_name"))
-    listen(
-        SqlEvaluationDatasetRecord,
-        "before_insert",
-        check_uniqueness_factory(SqlEvaluationDatasetRecord, "dataset_id", "input_hash"),
-    )
-    listen(SqlExperiment, "before_insert", check_uniqueness_factory(SqlExperiment, "workspace", "name"))
-    listen(
-        SqlExperimentPermission,
-        "before_insert",
-        check_uniqueness_factory(SqlExperimentPermission, "experiment_id", "user_id"),
-    )
+    unique_constraint(SqlGatewayEndpoint, "workspace", "name")
+    unique_constraint(SqlGatewayModelDefinition, "workspace", "name")
+    unique_constraint(SqlGatewaySecret, "workspace", "secret_name")
+    unique_constraint(SqlEvaluationDatasetRecord, "dataset_id", "input_hash")
+    unique_constraint(SqlExperiment, "workspace", "name")
+    unique_constraint(SqlExperimentPermission, "experiment_id", "user_id")
 
-    listen(SqlRegisteredModel, "before_insert", check_uniqueness_factory(SqlRegisteredModel, "name"))
-    listen(
-        SqlRegisteredModelPermission,
-        "before_insert",
-        check_uniqueness_factory(SqlRegisteredModelPermission, "name", "user_id"),
-    )
+    unique_constraint(SqlRegisteredModel, "name")
+    unique_constraint(SqlRegisteredModelPermission, "name", "user_id")
+
+    unique_constraint(SqlUser, "username")
+
+    listen(Session, "before_flush", check_uniqueness)
+    listen(Session, "after_flush_postexec", release_unique_keys_after_flush)
+    listen(Session, "do_orm_execute", invalidate_uniqueness_cache)
+    for sa_entity in UNIQUE_CONSTRAINTS:
+        listen(sa_entity, "after_insert", cache_unique_values, propagate=True)
+        listen(sa_entity, "after_update", cache_unique_values, propagate=True)
+        listen(sa_entity, "after_delete", uncache_unique_values, propagate=True)
+    listen(Session, "after_soft_rollback", release_unique_keys_after_rollback)
+
+
+def unique_constraint(sa_entity, *attribute_names):
+    """
+    Register an emulated UNIQUE constraint on the given model attributes.
+    """
+    constraints = UNIQUE_CONSTRAINTS.setdefault(sa_entity, [])
+    if attribute_names not in constraints:
+        constraints.append(attribute_names)
+
+
+def constrained_targets(targets: t.Iterable[t.Any]) -> t.Dict[t.Any, t.List[t.Any]]:
+    """
+    Group instances of constrained models by their model class.
+    """
+    outcome: t.Dict[t.Any, t.List[t.Any]] = {}
+    for target in targets:
+        for class_ in type(target).__mro__:
+            if class_ in UNIQUE_CONSTRAINTS:
+                outcome.setdefault(class_, []).append(target)
+    return outcome
+
+
+def check_uniqueness(session, flush_context, instances):
+    """
+    SQLAlchemy event handler for the `before_flush` event, validating all pending rows of constrained models.
+    """
+    if get_uniqueness_mode() is UniquenessMode.SHADOW_KEYS:
+        claim_shadow_keys(session)
+        return
+    if not session.new:
+        return
+    for sa_entity, targets in constrained_targets(session.new).items():
+        for attribute_names in UNIQUE_CONSTRAINTS[sa_entity]:
+            check_uniqueness_batch(session.connection(), sa_entity, attribute_names, targets)
+
+
+def check_uniqueness_batch(connection, sa_entity, attribute_names: t.Tuple[str, ...], targets: t.List[t.Any]):
+    """
+    Run a manual column value uniqueness check on a batch of rows, and raise an IntegrityError if applicable.
+
+    Duplicates within the batch are detected in memory. Then, existing rows are
+    looked up using one query per chunk of rows.
+    """
+    # Synthesize a canonical "name" for the constraint,
+    # composed of all column names involved.
+    constraint_name = "-".join(attribute_names)
+    table = sa_entity.__tablename__
+    keys = [tuple(getattr(target, name) for name in attribute_names) for target in targets]
+    if len(set(keys)) != len(keys):
+        raise duplicate_key_error(f"<pending rows of {table}>", table, constraint_name)
+
+    # Reject value combinations known to exist without a database round trip.
+    # All others are verified against the database.
+    cache = get_uniqueness_cache()
+    database = database_key(connection.engine)
+    if any(cache.contains(database, table, constraint_name, key) for key in keys):
+        raise duplicate_key_error(f"<cached unique key of {table}>", table, constraint_name)
+
+    for offset in range(0, len(keys), UNIQUENESS_CHECK_CHUNK_SIZE):
+        chunk = keys[offset : offset + UNIQUENESS_CHECK_CHUNK_SIZE]
+        stmt = uniqueness_query(sa_entity, attribute_names, chunk).limit(1)
+        with instrumentation.timed("uniqueness_check", [table]):
+            results = connection.execute(stmt).fetchall()
+        if results:
+            cache.add(database, table, constraint_name, tuple(results[0]))
+            raise duplicate_key_error(str(stmt), table, constraint_name)
+
+
+def uniqueness_query(sa_entity, attribute_names: t.Tuple[str, ...], keys: t.List[t.Tuple[t.Any, ...]]) -> sa.Select:
+    """
+    Build a query selecting the rows matching any of the given value combinations of a constraint.
+
+    Values are grouped by all but the last column, like `(a = 1 AND b IN (2, 3)) OR (a = 4 AND b IN (5))`,
+    because CrateDB does not support row value comparisons like `(a, b) IN (...)`.
+    """
+    columns = [sa.inspect(sa_entity).columns[name] for name in attribute_names]
+    groups: t.Dict[t.Tuple[t.Any, ...], t.List[t.Any]] = {}
+    for key in keys:
+        groups.setdefault(key[:-1], []).append(key[-1])
+    criteria = []
+    for prefix, values in groups.items():
+        last = []
+        if non_null := [value for value in values if value is not None]:
+            last.append(columns[-1].in_(non_null))
+        if len(non_null) != len(values):
+            last.append(columns[-1].is_(None))
+        criteria.append(
+            sa.and_(*[column == value for column, value in zip(columns, prefix, strict=False)], sa.or_(*last))
+        )
+    return sa.select(*columns).where(sa.or_(*criteria))
+
+
+def claim_shadow_keys(session):
+    """
+    Claim shadow keys for all pending and renamed rows of constrained models, and
+    record the shadow keys of deleted and renamed rows, to be released after the flush.
+    """
+    if not (session.new or session.dirty or session.deleted):
+        return
+    connection = session.connection()
+    provision_unique_keys(connection, backfill_unique_keys)
+    claimed = session.info.setdefault(CLAIMED_KEYS_KEY, set())
+    released = session.info.setdefault(RELEASED_KEYS_KEY, set())
+
+    for sa_entity, targets in constrained_targets(session.new).items():
+        for attribute_names in UNIQUE_CONSTRAINTS[sa_entity]:
+            values = [tuple(getattr(target, name) for name in attribute_names) for target in targets]
+            claimed.update(claim_shadow_keys_batch(session, sa_entity, attribute_names, values))
+
+    for sa_entity, targets in constrained_targets(session.dirty).items():
+        for attribute_names in UNIQUE_CONSTRAINTS[sa_entity]:
+            values = []
+            for target in targets:
+                state = sa.inspect(target)
+                histories = [state.attrs[name].history for name in attribute_names]
+                if not any(history.has_changes() for history in histories):
+                    continue
+                values.append(tuple(getattr(target, name) for name in attribute_names))
+                if all(history.deleted or history.unchanged for history in histories):
+                    old = tuple((history.deleted or history.unchanged)[0] for history in histories)
+                    released.add(unique_key(sa_entity.__tablename__, "-".join(attribute_names), old))
+            claimed.update(claim_shadow_keys_batch(session, sa_entity, attribute_names, values))
 
-    listen(SqlUser, "before_insert", check_uniqueness_factory(SqlUser, "username"))
+    for sa_entity, targets in constrained_targets(session.deleted).items():
+        for attribute_names in UNIQUE_CONSTRAINTS[sa_entity]:
+            for target in targets:
+                old = tuple(getattr(target, name) for name in attribute_names)
+                released.add(unique_key(sa_entity.__tablename__, "-".join(attribute_names), old))
+
+
+def claim_shadow_keys_batch(
+    session, sa_entity, attribute_names: t.Tuple[str, ...], values: t.List[t.Tuple[t.Any, ...]]
+) -> t.Set[str]:
+    """
+    Claim shadow keys for a batch of rows, and raise an IntegrityError if applicable.
+
+    When a key has been claimed before, but no corresponding row exists, for example
+    because rows have been deleted in bulk, its claim is taken over when it is stale.
+    """
+    if not values:
+        return set()
+    connection = session.connection()
+    constraint_name = "-".join(attribute_names)
+    table = sa_entity.__tablename__
+    keys = {unique_key(table, constraint_name, value): value for value in values}
+    if len(keys) != len(values):
+        raise duplicate_key_error(f"<pending rows of {table}>", table, constraint_name)
+
+    # Reject value combinations known to exist without a database round trip.
+    cache = get_uniqueness_cache()
+    database = database_key(connection.engine)
+    if any(cache.contains(database, table, constraint_name, value) for value in values):
+        raise duplicate_key_error(f"<cached unique key of {table}>", table, constraint_name)
+
+    with instrumentation.timed("uniqueness_check", [table]):
+        conflicts = claim_unique_keys(connection, table, constraint_name, keys)
+        if conflicts:
+            existing = connection.execute(
+                uniqueness_query(sa_entity, attribute_names, [keys[key] for key in conflicts])
+            )
+            owned = {unique_key(table, constraint_name, tuple(row)) for row in existing}
+            conflicts -= reclaim_unique_keys(connection, table, constraint_name, conflicts - owned)
+    if conflicts:
+        release_unique_keys(connection, set(keys) - conflicts)
+        raise duplicate_key_error(f"<unique key of {table}>", table, constraint_name)
+    return set(keys)
+
+
+def backfill_unique_keys(connection):
+    """
+    Claim shadow keys for all existing rows of constrained models, when provisioning the `unique_keys` table.
+    """
+    inspector = sa.inspect(connection)
+    for sa_entity, constraints in UNIQUE_CONSTRAINTS.items():
+        table = sa_entity.__tablename__
+        if not inspector.has_table(table):
+            continue
+        connection.execute(sa.text(f'REFRESH TABLE "{table}"'))
+        for attribute_names in constraints:
+            columns = [sa.inspect(sa_entity).columns[name] for name in attribute_names]
+            constraint_name = "-".join(attribute_names)
+            keys = [unique_key(table, constraint_name, tuple(row)) for row in connection.execute(sa.select(*columns))]
+            claim_unique_keys(connection, table, constraint_name, keys)
+
+
+def release_unique_keys_after_flush(session, flush_context):
+    """
+    SQLAlchemy event handler for the `after_flush_postexec` event, releasing shadow keys of deleted and renamed rows.
+
+    CrateDB does not support transactions, so claims are final once the flush succeeded.
+    """
+    session.info.pop(CLAIMED_KEYS_KEY, None)
+    released = session.info.pop(RELEASED_KEYS_KEY, None)
+    if released:
+        release_unique_keys(session.connection(), released)
+
+
+def release_unique_keys_after_rollback(session, previous_transaction):
+    """
+    SQLAlchemy event handler for the `after_soft_rollback` event, releasing shadow keys claimed by a failed flush.
+    """
+    session.info.pop(RELEASED_KEYS_KEY, None)
+    claimed = session.info.pop(CLAIMED_KEYS_KEY, None)
+    if claimed:
+        with session.get_bind().connect() as connection:
+            release_unique_keys(connection, claimed)
+            connection.commit()
+
+
+def cache_unique_values(mapper, connection, target):
+    """
+    SQLAlchemy event handler for `after_{insert,update}` events on constrained models,
+    recording value combinations which have been inserted or renamed.
+    """
+    cache = get_uniqueness_cache()
+    database = database_key(connection.engine)
+    table = target.__tablename__
+    state = sa.inspect(target)
+    for sa_entity in constrained_targets([target]):
+        for attribute_names in UNIQUE_CONSTRAINTS[sa_entity]:
+            constraint_name = "-".join(attribute_names)
+            histories = [state.attrs[name].history for name in attribute_names]
+            if any(history.deleted for history in histories) and all(
+                history.deleted or history.unchanged for history in histories
+            ):
+                old = tuple((history.deleted or history.unchanged)[0] for history in histories)
+                cache.discard(database, table, constraint_name, old)
+            values = tuple(getattr(target, name) for name in attribute_names)
+            cache.add(database, table, constraint_name, values)
+
+
+def uncache_unique_values(mapper, connection, target):
+    """
+    SQLAlchemy event handler for the `after_delete` event on constrained models,
+    recording value combinations which have been deleted.
+    """
+    cache = get_uniqueness_cache()
+    database = database_key(connection.engine)
+    for sa_entity in constrained_targets([target]):
+        for attribute_names in UNIQUE_CONSTRAINTS[sa_entity]:
+            values = tuple(getattr(target, name) for name in attribute_names)
+            cache.discard(database, target.__tablename__, "-".join(attribute_names), values)
+
+
+def invalidate_uniqueness_cache(orm_execute_state):
+    """
+    SQLAlchemy event handler for the `do_orm_execute` event, forgetting cached value
+    combinations of constrained models which are deleted or updated in bulk.
+    """
+    if not (orm_execute_state.is_delete or orm_execute_state.is_update):
+        return
+    for mapper in orm_execute_state.all_mappers:
+        if any(issubclass(mapper.class_, sa_entity) for sa_entity in UNIQUE_CONSTRAINTS):
+            get_uniqueness_cache().invalidate(mapper.class_.__tablename__)
+
+
+def duplicate_key_error(statement: str, table: str, constraint_name: str) -> IntegrityError:
+    return IntegrityError(
+        statement=statement,
+        params=[],
+        orig=Exception(f"DuplicateKeyException in table '{table}' on constraint '{constraint_name}'"),
+    )
 
 
 def polyfill_refresh_after_dml():
     """
-    Run `REFRESH TABLE <tablename>` after each INSERT, UPDATE, and DELETE operation.
+    Run `REFRESH TABLE <tablename>` after INSERT, UPDATE, and DELETE operations.
 
     CrateDB is eventually consistent, i.e. write operations are not flushed to
     disk immediately, so readers may see stale data. In a traditional OLTP-like
     application, this is not applicable.
 
     This SQLAlchemy extension makes sure that data is synchronized after each
-    operation manipulating data.
+    operation manipulating data. In order not to emit one `REFRESH TABLE` per
+    row, the tables modified within a session flush are collected, and refreshed
+    using a single statement when the flush completes.
+
+    The point in time when refreshing happens is controlled by the consistency
+    mode of the engine, see `mlflow_cratedb.adapter.refresh.ConsistencyMode`.
 
     TODO: Submit patch to `crate-python`, to be enabled by a
           dialect parameter `crate_dml_refresh` or such.
@@ -66,14 +361,55 @@ def polyfill_refresh_after_dml():
     from mlflow.store.db.base_sql_model import Base
 
     for mapper in Base.registry.mappers:
-        listen(mapper.class_, "after_insert", do_refresh)
-        listen(mapper.class_, "after_update", do_refresh)
-        listen(mapper.class_, "after_delete", do_refresh)
+        listen(mapper.class_, "after_insert", mark_dirty)
+        listen(mapper.class_, "after_update", mark_dirty)
+        listen(mapper.class_, "after_delete", mark_dirty)
+    listen(Session, "after_flush", do_refresh)
+    listen(Session, "before_commit", do_refresh_on_commit)
+
+
+def mark_dirty(mapper, connection, target):
+    """
+    SQLAlchemy event handler for `after_{insert,update,delete}` events, recording the modified table.
+    """
+    if get_refresh_policy(connection).mode is ConsistencyMode.NONE:
+        return
+    session = object_session(target)
+    if session is None:
+        refresh_tables(connection, [target.__tablename__])
+        return
+    session.info.setdefault(DIRTY_TABLES_KEY, set()).add(target.__tablename__)
 
 
-def do_refresh(mapper, connection, target):
+def do_refresh(session, flush_context):
     """
-    SQLAlchemy event handler for `after_{insert,update,delete}` events, invoking `REFRESH TABLE`.
+    SQLAlchemy event handler for the `after_flush` event, invoking `REFRESH TABLE` on all modified tables.
+    """
+    if not session.info.get(DIRTY_TABLES_KEY):
+        return
+    policy = get_refresh_policy(session.get_bind())
+    if policy.mode is ConsistencyMode.PER_COMMIT:
+        return
+    tables = session.info.pop(DIRTY_TABLES_KEY)
+    if policy.mode is ConsistencyMode.ON_READ:
+        get_dirty_tables().mark(database_key(session.get_bind().engine), tables)
+    elif policy.refresher is not None:
+        policy.refresher.submit(tables)
+    else:
+        refresh_tables(session.connection(), tables)
+
+
+def do_refresh_on_commit(session):
+    """
+    SQLAlchemy event handler for the `before_commit` event, used by the `per-commit` consistency mode.
+
+    The session is flushed upfront, so all tables modified within the transaction are refreshed at once.
     """
-    sql = f"REFRESH TABLE {target.__tablename__}"
-    connection.execute(sa.text(sql))
+    if not (session.info.get(DIRTY_TABLES_KEY) or session.new or session.dirty or session.deleted):
+        return
+    if get_refresh_policy(session.get_bind()).mode is not ConsistencyMode.PER_COMMIT:
+        return
+    session.flush()
+    tables = session.info.pop(DIRTY_TABLES_KEY, None)
+    if tables:
+        refresh_tables(session.connection(), tables)
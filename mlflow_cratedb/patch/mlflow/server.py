@@ -2,6 +2,9 @@
 # It is defined in `pyproject.toml` at `[project.entry-points."mlflow.app"]`.
 MLFLOW_APP_NAME = "mlflow-cratedb"
 
+# HTTP endpoint exposing the adapter's instrumentation counters.
+INSTRUMENTATION_ROUTE = "/cratedb/instrumentation"
+
 
 def patch_run_server():
     """
@@ -24,6 +27,22 @@ def patch_run_server():
     server._run_server = run_server
 
 
+def register_instrumentation_route():
+    """
+    Expose the adapter's instrumentation counters as JSON on the tracking server.
+    The Flask application is mounted by the FastAPI application, so it serves the route on both.
+    """
+    from flask import jsonify
+    from mlflow.server import app as flask_app
+
+    from mlflow_cratedb.adapter.instrumentation import instrumentation
+
+    def cratedb_instrumentation():
+        return jsonify(instrumentation.snapshot())
+
+    flask_app.add_url_rule(INSTRUMENTATION_ROUTE, "cratedb_instrumentation", cratedb_instrumentation)
+
+
 def _get_args_dict(fn, args, kwargs):
     """
     Returns a dictionary containing both args and kwargs.
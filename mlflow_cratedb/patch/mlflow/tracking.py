@@ -5,6 +5,7 @@ def patch_tracking():
     patch_get_percentile_aggregation()
     patch_get_time_bucket_expression()
     patch_create_default_experiment()
+    patch_get_experiment()
 
 
 def patch_create_default_experiment():
@@ -30,6 +31,49 @@ def patch_create_default_experiment():
     SqlAlchemyStore._create_default_experiment = _create_default_experiment  # type: ignore[method-assign]
 
 
+def patch_get_experiment():
+    """
+    Look up experiments by primary key only, and check their lifecycle stage afterwards.
+
+    CrateDB serves primary key lookups in real time. When using the `on-read`
+    consistency mode, reading an experiment by its identifier will not need
+    a `REFRESH TABLE` statement.
+    """
+    from mlflow.entities.lifecycle_stage import LifecycleStage
+    from mlflow.exceptions import MlflowException
+    from mlflow.protos.databricks_pb2 import INVALID_PARAMETER_VALUE, RESOURCE_DOES_NOT_EXIST
+    from mlflow.store.tracking.sqlalchemy_store import SqlAlchemyStore
+
+    def _get_experiment(self, session, experiment_id, view_type, eager=False):
+        from mlflow.store.tracking.dbmodels.models import SqlExperiment
+
+        experiment_id = experiment_id or SqlAlchemyStore.DEFAULT_EXPERIMENT_ID
+        stages = LifecycleStage.view_type_to_stages(view_type)
+        query_options = self._get_eager_experiment_query_options() if eager else []
+
+        try:
+            experiment_id_int = int(experiment_id)
+        except (ValueError, TypeError) as ex:
+            raise MlflowException(
+                f"Invalid experiment ID '{experiment_id}'. Experiment ID must be a valid integer.",
+                INVALID_PARAMETER_VALUE,
+            ) from ex
+
+        experiment = (
+            self._get_query(session, SqlExperiment)
+            .options(*query_options)
+            .filter(SqlExperiment.experiment_id == experiment_id_int)
+            .one_or_none()
+        )
+
+        if experiment is None or experiment.lifecycle_stage not in stages:
+            raise MlflowException(f"No Experiment with id={experiment_id_int} exists", RESOURCE_DOES_NOT_EXIST)
+
+        return experiment
+
+    SqlAlchemyStore._get_experiment = _get_experiment  # type: ignore[method-assign]
+
+
 def patch_get_percentile_aggregation():
     """
     Render the percentile aggregation clause literally, because using query
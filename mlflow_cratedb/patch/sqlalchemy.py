@@ -1,4 +1,7 @@
 def patch_sqlalchemy():
     from sqlalchemy_cratedb.support import patch_autoincrement_timestamp
 
+    from mlflow_cratedb.adapter.dialect import register_dialect
+
     patch_autoincrement_timestamp()
+    register_dialect()
@@ -5,4 +5,13 @@
 # from mlflow.server import app  # noqa: F401
 
 # Use FastAPI with uvicorn
-from mlflow.server.fastapi_app import app  # noqa: F401
+from mlflow.server.fastapi_app import app
+
+from mlflow_cratedb.patch.mlflow.fastapi_app import register_async_routes  # noqa: E402
+from mlflow_cratedb.patch.mlflow.server import register_instrumentation_route  # noqa: E402
+
+# Expose the adapter's instrumentation counters.
+register_instrumentation_route()
+
+# Serve the endpoints used by logging clients without blocking threads, using `crate+psycopg://`.
+register_async_routes(app)
@@ -62,24 +62,11 @@ def engine(db_uri: str):
     """
     Provide an SQLAlchemy engine object using the `testdrive` schema.
     """
-    import sqlalchemy as sa
     from mlflow.store.db.utils import create_sqlalchemy_engine
-    from sqlalchemy_cratedb.support import quote_relation_name
-
-    url = sa.make_url(db_uri)
-    schema = url.query.get("schema")
 
+    # The search path is configured from the `schema` query parameter, see `SessionSettings`.
     engine = create_sqlalchemy_engine(db_uri)
 
-    if schema is not None:
-
-        def receive_engine_connect(conn):
-            """Configure search path, so all database connections always use the right schema."""
-            conn.execute(sa.text(f"SET search_path={quote_relation_name(schema)};"))
-            conn.commit()
-
-        sa.event.listen(engine, "engine_connect", receive_engine_connect)
-
     yield engine
 
 
@@ -117,7 +104,8 @@ def reset_database(engine: sa.Engine):
     With dropping and re-creating all the tables each time,
     `poe test-fast` takes whopping 781.84s. Let's just apply
     a `DELETE FROM <table>` procedure going forward, which is
-    much cheaper (138.97s for `poe test-fast`).
+    much cheaper (138.97s for `poe test-fast`). Empty tables
+    are skipped, and the others are truncated concurrently.
     """
     from mlflow_cratedb.adapter.setup_db import (
         _setup_db_create_tables,
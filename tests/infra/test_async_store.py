@@ -0,0 +1,158 @@
+import asyncio
+import json
+import typing as t
+
+import pytest
+from mlflow.server import BACKEND_STORE_URI_ENV_VAR
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Match, Mount
+
+from mlflow_cratedb.adapter.async_store import async_db_uri, supports_async
+from mlflow_cratedb.patch.mlflow.fastapi_app import (
+    _async_endpoint,
+    _async_handlers,
+    _request_schemas,
+    register_async_routes,
+)
+
+
+def test_async_db_uri():
+    """
+    Verify the asynchronous variant of the `crate+psycopg://` dialect is selected.
+    """
+    assert supports_async("crate+psycopg://localhost/?schema=mlflow")
+    assert not supports_async("crate://localhost/?schema=mlflow")
+    assert not supports_async(None)
+    assert async_db_uri("crate+psycopg://crate@localhost/?schema=mlflow") == (
+        "crate+psycopg_async://crate@localhost/?schema=mlflow"
+    )
+    with pytest.raises(ValueError) as ex:
+        async_db_uri("crate://localhost/")
+    assert ex.match("Asynchronous database access needs the `crate\\+psycopg://` dialect")
+
+
+def make_app() -> Starlette:
+    return Starlette(routes=[Mount("/", app=Response("flask"))])
+
+
+def http_scope(method: str, path: str, query_string: bytes = b"", headers: t.Optional[list] = None) -> dict:
+    return {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "root_path": "",
+        "query_string": query_string,
+        "headers": headers or [],
+    }
+
+
+def invoke(endpoint, scope: dict, body: bytes = b"") -> Response:
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return asyncio.run(endpoint(Request(scope, receive)))
+
+
+def test_register_async_routes(monkeypatch):
+    """
+    Verify endpoints of logging clients precede the Flask application, except static paths of other endpoints.
+    """
+    monkeypatch.setenv(BACKEND_STORE_URI_ENV_VAR, "crate+psycopg://localhost/?schema=mlflow")
+    app = make_app()
+    register_async_routes(app)
+
+    paths = {route.path for route in app.router.routes[:-1]}
+    assert "/api/2.0/mlflow/runs/log-batch" in paths
+    assert "/ajax-api/2.0/mlflow/metrics/get-history" in paths
+    assert "/api/3.0/mlflow/traces/{trace_id}" in paths
+    assert len(app.router.routes) == len(_async_handlers()) * 2 + 1
+    assert isinstance(app.router.routes[-1], Mount)
+
+    get_trace_info = next(
+        route
+        for route in app.router.routes
+        if getattr(route, "path", None) == "/api/3.0/mlflow/traces/{trace_id}" and "GET" in route.methods
+    )
+    assert get_trace_info.matches(http_scope("GET", "/api/3.0/mlflow/traces/tr-123"))[0] is Match.FULL
+    assert get_trace_info.matches(http_scope("GET", "/api/3.0/mlflow/traces/get"))[0] is Match.NONE
+    assert get_trace_info.matches(http_scope("GET", "/api/3.0/mlflow/traces/batchGet"))[0] is Match.NONE
+
+
+def test_register_async_routes_http_driver(monkeypatch):
+    """
+    Verify the Flask application serves all endpoints when using the `crate://` dialect.
+    """
+    monkeypatch.setenv(BACKEND_STORE_URI_ENV_VAR, "crate://localhost/?schema=mlflow")
+    app = make_app()
+    register_async_routes(app)
+    assert len(app.router.routes) == 1
+
+
+def test_register_async_routes_flask_hooks(monkeypatch):
+    """
+    Verify the Flask application serves all endpoints while its request hooks, like authentication,
+    or workspaces are enabled, also when they are enabled after the routes have been registered.
+    """
+    from mlflow.server import app as flask_app
+
+    def authenticate():
+        pass
+
+    monkeypatch.setenv(BACKEND_STORE_URI_ENV_VAR, "crate+psycopg://localhost/?schema=mlflow")
+    monkeypatch.setattr(flask_app, "before_request_funcs", {})
+    app = make_app()
+    register_async_routes(app)
+    log_batch = next(route for route in app.router.routes if route.path == "/api/2.0/mlflow/runs/log-batch")
+    scope = http_scope("POST", log_batch.path)
+    assert log_batch.matches(scope)[0] is Match.FULL
+
+    flask_app.before_request(authenticate)
+    assert log_batch.matches(scope)[0] is Match.NONE
+
+    monkeypatch.setattr(flask_app, "before_request_funcs", {})
+    monkeypatch.setenv("MLFLOW_ENABLE_WORKSPACES", "true")
+    assert log_batch.matches(scope)[0] is Match.NONE
+
+
+def test_request_schemas():
+    """
+    Verify the validation schemas are captured from MLflow's request handlers.
+    """
+    from mlflow.protos.service_pb2 import GetTraceInfoV3, LogBatch, SearchRuns
+
+    schemas = _request_schemas([LogBatch, SearchRuns, GetTraceInfoV3])
+    assert list(schemas[LogBatch]) == ["run_id", "metrics", "params", "tags"]
+    assert list(schemas[SearchRuns]) == ["experiment_ids", "filter", "max_results", "order_by"]
+    assert schemas[GetTraceInfoV3] is None
+
+
+def test_async_endpoint_invalid_request():
+    """
+    Verify invalid requests are rejected like MLflow's request handlers do.
+    """
+    from mlflow.protos.service_pb2 import LogBatch, SearchRuns
+
+    headers = [(b"content-type", b"application/json")]
+    schemas = _request_schemas([LogBatch, SearchRuns])
+    log_batch = _async_endpoint(LogBatch, _async_handlers()[LogBatch], schemas[LogBatch])
+    search_runs = _async_endpoint(SearchRuns, _async_handlers()[SearchRuns], schemas[SearchRuns])
+    responses = [
+        invoke(log_batch, http_scope("POST", "/api/2.0/mlflow/runs/log-batch", headers=headers), b"{invalid"),
+        invoke(log_batch, http_scope("POST", "/api/2.0/mlflow/runs/log-batch"), b'{"run_id": "foo"}'),
+        invoke(log_batch, http_scope("POST", "/api/2.0/mlflow/runs/log-batch", headers=headers), b"{}"),
+        invoke(
+            log_batch,
+            http_scope("POST", "/api/2.0/mlflow/runs/log-batch", headers=headers),
+            b'{"run_id": "foo", "metrics": [{"key": "loss"}]}',
+        ),
+        invoke(search_runs, http_scope("GET", "/api/2.0/mlflow/runs/search", query_string=b"max_results=50001")),
+    ]
+    for response in responses:
+        assert response.status_code == 400
+        assert json.loads(response.body)["error_code"] == "INVALID_PARAMETER_VALUE"
+    assert "Content-Type" in json.loads(responses[1].body)["message"]
+    assert "run_id" in json.loads(responses[2].body)["message"]
+    assert "metrics[0].value" in json.loads(responses[3].body)["message"]
+    assert "max_results" in json.loads(responses[4].body)["message"]
@@ -24,3 +24,25 @@ def test_unknown_parameter():
 
     result = runner.invoke(cli, args="foo", catch_exceptions=False)
     assert result.exit_code == 2
+
+
+def test_retention_help():
+    """
+    CLI test: Invoke `mlflow-cratedb cratedb retention --help`.
+    """
+    runner = CliRunner()
+
+    result = runner.invoke(cli, args="cratedb retention --help", catch_exceptions=False)
+    assert result.exit_code == 0
+    assert "--older-than" in result.output
+
+
+def test_purge_usage():
+    """
+    CLI test: Invoke `mlflow-cratedb cratedb purge` without selecting data to purge.
+    """
+    runner = CliRunner()
+
+    result = runner.invoke(cli, args="cratedb purge --backend-store-uri=crate://localhost/ --yes")
+    assert result.exit_code == 2
+    assert "Use either `--experiment-id` or `--workspace`" in result.output
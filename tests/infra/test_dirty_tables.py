@@ -0,0 +1,82 @@
+import multiprocessing
+import os
+import sys
+
+import pytest
+
+from mlflow_cratedb.adapter.dirty_tables import DirtyTableRegistry, SharedDirtyTableRegistry, verify_private_directory
+
+DATABASE = "crate://crate@localhost/?schema=testdrive"
+
+
+def mark_tables(directory: str):
+    SharedDirtyTableRegistry(directory).mark(DATABASE, ["metrics", "params"])
+
+
+def test_dirty_tables_process():
+    """
+    Verify a table is only clean again when it has not been marked while refreshing it.
+    """
+    registry = DirtyTableRegistry()
+    registry.mark(DATABASE, ["metrics", "params"])
+    generations = registry.dirty(DATABASE, ["metrics", "params", "runs"])
+    assert set(generations) == {"metrics", "params"}
+
+    registry.mark(DATABASE, ["params"])
+    registry.clean(DATABASE, generations)
+    assert set(registry.dirty(DATABASE, ["metrics", "params", "runs"])) == {"params"}
+    assert registry.dirty("crate://localhost/?schema=other", ["params"]) == {}
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Requires POSIX advisory file locks")
+def test_dirty_tables_shared(tmp_path):
+    """
+    Verify tables marked dirty by another process are visible, and can be cleaned.
+    """
+    registry = SharedDirtyTableRegistry(str(tmp_path))
+    assert registry.dirty(DATABASE, ["metrics"]) == {}
+
+    process = multiprocessing.get_context("spawn").Process(target=mark_tables, args=(str(tmp_path),))
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+
+    generations = registry.dirty(DATABASE, ["metrics", "params", "runs"])
+    assert set(generations) == {"metrics", "params"}
+    registry.clean(DATABASE, generations)
+    assert registry.dirty(DATABASE, ["metrics", "params"]) == {}
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Requires POSIX file permissions")
+def test_dirty_tables_shared_private_directory(tmp_path):
+    """
+    Verify the registry creates a private directory, and refuses directories of other users.
+    """
+    directory = tmp_path / "registry"
+    registry = SharedDirtyTableRegistry(str(directory))
+    registry.mark(DATABASE, ["metrics"])
+    assert directory.stat().st_mode & 0o777 == 0o700
+    assert set(registry.dirty(DATABASE, ["metrics"])) == {"metrics"}
+
+    shared = tmp_path / "shared"
+    shared.mkdir(mode=0o777)
+    shared.chmod(0o777)
+    with pytest.raises(PermissionError):
+        verify_private_directory(str(shared))
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Requires POSIX symbolic links")
+def test_dirty_tables_shared_symlink_fallback(tmp_path):
+    """
+    Verify a planted symbolic link is not followed, and the registry falls back to process scope.
+    """
+    directory = tmp_path / "registry"
+    directory.mkdir(mode=0o700)
+    target = tmp_path / "target"
+    target.write_bytes(b"precious")
+    registry = SharedDirtyTableRegistry(str(directory))
+    os.symlink(target, registry.path(DATABASE))
+
+    registry.mark(DATABASE, ["metrics"])
+    assert set(registry.dirty(DATABASE, ["metrics", "params"])) == {"metrics"}
+    assert target.read_bytes() == b"precious"
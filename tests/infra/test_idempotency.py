@@ -0,0 +1,28 @@
+import sqlalchemy as sa
+
+from mlflow_cratedb.adapter.idempotency import idempotent_insert
+from mlflow_cratedb.adapter.storage import StorageProfiles
+
+STATEMENT = "INSERT INTO metrics (key, value, timestamp, step, is_nan, run_uuid) VALUES (?, ?, ?, ?, ?, ?)"
+
+
+def test_idempotent_insert():
+    """
+    Verify only plain inserts into tables with a natural primary key are rewritten.
+    """
+    assert idempotent_insert(STATEMENT, {"metrics"}) == f"{STATEMENT} ON CONFLICT DO NOTHING"
+    assert idempotent_insert(STATEMENT, {"params"}) == STATEMENT
+    assert idempotent_insert("SELECT * FROM metrics", {"metrics"}) == "SELECT * FROM metrics"
+    upsert = f"{STATEMENT} ON CONFLICT DO NOTHING"
+    assert idempotent_insert(upsert, {"metrics"}) == upsert
+
+
+def test_natural_key_statement():
+    """
+    Verify the `natural_key` setting adds the primary key of MLflow's model to the `metrics` table.
+    """
+    profiles = StorageProfiles.from_url(sa.make_url("crate://localhost/?storage.metrics.natural_key=true"))
+    statement = profiles.render("metrics", 'CREATE TABLE "metrics" (\n\trun_uuid TEXT\n);', nodes=1)
+    assert '\tPRIMARY KEY ("run_uuid", "key", "step", "timestamp", "value", "is_nan")\n)' in statement
+    assert profiles.natural_key_tables() == {"metrics"}
+    assert StorageProfiles().natural_key_tables() == set()
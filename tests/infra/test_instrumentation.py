@@ -0,0 +1,39 @@
+from mlflow_cratedb.adapter.instrumentation import Instrumentation
+from mlflow_cratedb.patch.mlflow.server import INSTRUMENTATION_ROUTE
+
+
+def test_instrumentation_histogram():
+    """
+    Verify durations are recorded per operation and table, using cumulative buckets.
+    """
+    instrumentation = Instrumentation()
+    instrumentation.record("refresh", ["metrics", "params"], 3.0)
+    instrumentation.record("refresh", ["metrics"], 700.0)
+    with instrumentation.timed("uniqueness_check", ["experiments"]):
+        pass
+
+    snapshot = instrumentation.snapshot()
+    assert set(snapshot) == {"refresh", "uniqueness_check"}
+    assert snapshot["refresh"]["metrics"]["count"] == 2
+    assert snapshot["refresh"]["metrics"]["sum_ms"] == 703.0
+    assert snapshot["refresh"]["metrics"]["buckets"]["2"] == 0
+    assert snapshot["refresh"]["metrics"]["buckets"]["5"] == 1
+    assert snapshot["refresh"]["metrics"]["buckets"]["+Inf"] == 2
+    assert snapshot["refresh"]["params"]["count"] == 1
+    assert snapshot["uniqueness_check"]["experiments"]["count"] == 1
+
+    instrumentation.reset()
+    assert instrumentation.snapshot() == {}
+
+
+def test_instrumentation_route():
+    """
+    Verify the tracking server exposes the instrumentation counters.
+    """
+    from mlflow.server import app as flask_app
+
+    import mlflow_cratedb.server  # noqa: F401
+
+    response = flask_app.test_client().get(INSTRUMENTATION_ROUTE)
+    assert response.status_code == 200
+    assert isinstance(response.json, dict)
@@ -0,0 +1,77 @@
+from unittest import mock
+
+import pytest
+import sqlalchemy as sa
+
+from mlflow_cratedb.adapter.migration import column_definitions, migrate_schema, plan_migration
+from mlflow_cratedb.adapter.setup_db import METADATA_TABLE, _get_metadata, read_ddl_bundle
+
+STATEMENT = """
+CREATE TABLE IF NOT EXISTS "jobs" (
+	id VARCHAR(36) NOT NULL,
+	job_name VARCHAR(500) NOT NULL,
+	workspace VARCHAR(63) DEFAULT 'default, really' NOT NULL,
+	status_details OBJECT(DYNAMIC),
+	PRIMARY KEY (id)
+) CLUSTERED INTO 1 SHARDS;
+"""
+
+
+def test_column_definitions():
+    assert column_definitions(STATEMENT) == {
+        "id": "id VARCHAR(36) NOT NULL",
+        "job_name": "job_name VARCHAR(500) NOT NULL",
+        "workspace": "workspace VARCHAR(63) DEFAULT 'default, really' NOT NULL",
+        "status_details": "status_details OBJECT(DYNAMIC)",
+    }
+
+
+def test_plan_migration():
+    """
+    Verify only missing columns of existing tables are added, and primary key columns are reported.
+    """
+    alterations, unsupported = plan_migration(
+        {"jobs": STATEMENT, "runs": "CREATE TABLE runs (id TEXT);"},
+        {"jobs": {"job_name", "workspace"}},
+    )
+    assert alterations == ['ALTER TABLE "jobs" ADD COLUMN status_details OBJECT(DYNAMIC)']
+    assert unsupported == ["jobs.id"]
+
+
+def test_plan_migration_up_to_date():
+    """
+    Verify all columns of the DDL are recognized, so nothing is migrated against an up-to-date schema.
+    """
+    statements = {item["table"]: item["statement"] for item in read_ddl_bundle()}
+    existing = {table: set(column_definitions(statement)) for table, statement in statements.items()}
+    assert all(existing.values())
+    assert plan_migration(statements, existing) == ([], [])
+
+
+def test_migrate_schema_added_concurrently():
+    """
+    Verify a column added by another process after planning is skipped, and not reported as applied.
+    """
+    engine = sa.create_engine("sqlite://")
+    with engine.connect() as connection:
+        connection.execute(sa.text(f'CREATE TABLE "{METADATA_TABLE}" (key TEXT PRIMARY KEY, value TEXT)'))
+        connection.execute(sa.text('CREATE TABLE "jobs" (id TEXT, job_name TEXT, workspace TEXT, status_details TEXT)'))
+        connection.commit()
+
+    stale = {"jobs": {"id", "job_name", "workspace"}}
+    current = {"jobs": {"id", "job_name", "workspace", "status_details"}}
+    with mock.patch("mlflow_cratedb.adapter.migration.existing_columns", side_effect=[stale, current]):
+        assert migrate_schema(engine, {"jobs": STATEMENT}) == []
+    with engine.connect() as connection:
+        assert _get_metadata(connection, "schema_version")
+
+
+def test_migrate_schema_failure():
+    """
+    Verify errors of adding a column which still does not exist afterwards are propagated.
+    """
+    engine = sa.create_engine("sqlite://")
+    stale = {"jobs": {"id", "job_name", "workspace"}}
+    with mock.patch("mlflow_cratedb.adapter.migration.existing_columns", return_value=stale):
+        with pytest.raises(sa.exc.OperationalError, match="no such table"):
+            migrate_schema(engine, {"jobs": STATEMENT})
@@ -0,0 +1,28 @@
+import sqlalchemy as sa
+
+from mlflow_cratedb.adapter.registry import dispose_engines, get_shared_engine, normalize_uri
+
+
+def test_normalize_uri():
+    assert normalize_uri("CRATE://crate@localhost/?schema=mlflow&consistency=strict") == (
+        "crate://crate@localhost/?consistency=strict&schema=mlflow"
+    )
+
+
+def test_get_shared_engine():
+    """
+    Verify engines are created once per normalized URI, and shared afterwards.
+    """
+    created = []
+
+    def factory(db_uri: str) -> sa.Engine:
+        created.append(db_uri)
+        return sa.create_engine("sqlite://")
+
+    try:
+        engine = get_shared_engine("crate://localhost/?schema=foo&consistency=strict", factory)
+        assert get_shared_engine("crate://localhost/?consistency=strict&schema=foo", factory) is engine
+        assert get_shared_engine("crate://localhost/?schema=bar", factory) is not engine
+        assert created == ["crate://localhost/?schema=foo&consistency=strict", "crate://localhost/?schema=bar"]
+    finally:
+        dispose_engines()
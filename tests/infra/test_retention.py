@@ -0,0 +1,59 @@
+import datetime as dt
+
+import pytest
+
+from mlflow_cratedb.adapter.retention import partition_boundary
+from mlflow_cratedb.adapter.storage import StorageProfile, StorageProfiles
+
+STATEMENT = 'CREATE TABLE IF NOT EXISTS "metrics" (\n\t"timestamp" BIGINT NOT NULL,\n\tPRIMARY KEY (key)\n);'
+
+
+@pytest.mark.parametrize(
+    "unit,boundary",
+    [
+        ("day", dt.datetime(2026, 10, 15, tzinfo=dt.timezone.utc)),
+        ("week", dt.datetime(2026, 10, 12, tzinfo=dt.timezone.utc)),
+        ("month", dt.datetime(2026, 10, 1, tzinfo=dt.timezone.utc)),
+    ],
+)
+def test_partition_boundary(unit, boundary):
+    cutoff = dt.datetime(2026, 10, 15, 13, 37, tzinfo=dt.timezone.utc)
+    assert partition_boundary(cutoff, unit) == boundary
+
+
+def test_partitioned_statement():
+    """
+    Verify partitioning adds a generated column, and includes it into the primary key.
+    """
+    profiles = StorageProfiles({"metrics": StorageProfile(partition_by="month")})
+    statement = profiles.render("metrics", STATEMENT, nodes=1)
+    assert (
+        '"partition_time" TIMESTAMP WITH TIME ZONE GENERATED ALWAYS AS date_trunc(\'month\', "timestamp")' in statement
+    )
+    assert 'PRIMARY KEY (key, "partition_time")' in statement
+    assert ') PARTITIONED BY ("partition_time") CLUSTERED BY ("run_uuid") INTO 4 SHARDS' in statement
+
+
+def test_partitioned_statement_invalid():
+    with pytest.raises(ValueError, match="Table can not be partitioned: runs"):
+        StorageProfiles({"runs": StorageProfile(partition_by="month")}).render(
+            "runs", "CREATE TABLE runs (id TEXT);", 1
+        )
+    with pytest.raises(ValueError, match="Table can not be partitioned: trace_info"):
+        StorageProfiles({"trace_info": StorageProfile(partition_by="week")}).render(
+            "trace_info", "CREATE TABLE trace_info (request_id TEXT, timestamp_ms BIGINT);", 1
+        )
+    with pytest.raises(ValueError, match="Invalid partition unit: year"):
+        StorageProfiles({"metrics": StorageProfile(partition_by="year")}).render("metrics", STATEMENT, 1)
+
+
+def test_partitioned_statement_spans():
+    """
+    Verify spans are partitioned by their start time, converted from nanoseconds.
+    """
+    statement = 'CREATE TABLE IF NOT EXISTS "spans" (\n\tspan_id TEXT,\n\tPRIMARY KEY (trace_id, span_id)\n);'
+    profiles = StorageProfiles({"spans": StorageProfile(partition_by="day", ttl_days=30)})
+    statement = profiles.render("spans", statement, nodes=1)
+    assert "GENERATED ALWAYS AS date_trunc('day', start_time_unix_nano / 1000000)" in statement
+    assert 'PRIMARY KEY (trace_id, span_id, "partition_time")' in statement
+    assert profiles.partitioned_tables() == {"spans"}
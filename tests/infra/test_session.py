@@ -0,0 +1,83 @@
+import pytest
+import sqlalchemy as sa
+
+from mlflow_cratedb.adapter.session import SessionSettings, enable_session_settings, uri_parameters
+
+
+def test_session_settings_defaults():
+    assert SessionSettings().statements() == ["SET error_on_unknown_object_key = false"]
+
+
+def test_session_settings_from_url():
+    """
+    Verify the search path is derived from the schema, and additional settings from query parameters.
+    """
+    url = sa.make_url("crate://localhost/?schema=testdrive&session.statement_timeout=30s")
+    assert SessionSettings.from_url(url).statements() == [
+        "SET error_on_unknown_object_key = false",
+        "SET search_path = testdrive",
+        "SET statement_timeout = '30s'",
+    ]
+    assert uri_parameters(url) == ["session.statement_timeout"]
+
+
+def test_session_settings_quoting():
+    """
+    Verify numbers and booleans are rendered as they are, and other values as escaped string literals.
+    """
+    url = sa.make_url("crate://localhost/?schema=Test-Drive&session.statement_timeout=0&session.foo=it%27s")
+    assert SessionSettings.from_url(url).statements() == [
+        "SET error_on_unknown_object_key = false",
+        'SET search_path = "Test-Drive"',
+        "SET statement_timeout = 0",
+        "SET foo = 'it''s'",
+    ]
+
+
+def test_session_settings_invalid():
+    with pytest.raises(ValueError, match="Invalid session parameter: session.foo bar"):
+        SessionSettings.from_url(sa.make_url("crate://localhost/?session.foo%20bar=1"))
+    with pytest.raises(ValueError, match="Invalid session parameter: session.foo;"):
+        SessionSettings.from_url(sa.make_url("crate://localhost/?session.foo%3B=1"))
+
+
+def test_session_settings_once_per_connection():
+    """
+    Verify settings are applied to a DBAPI connection.
+    """
+    statements = []
+
+    class Cursor:
+        def execute(self, statement):
+            statements.append(statement)
+
+        def close(self):
+            pass
+
+    class Connection:
+        def cursor(self):
+            return Cursor()
+
+    SessionSettings({"search_path": "doc"}).receive_connect(Connection(), None)
+    assert statements == ["SET error_on_unknown_object_key = false", "SET search_path = doc"]
+
+
+@pytest.mark.parametrize(
+    "driver,listens_on_connect",
+    [
+        ("crate-python", False),
+        ("psycopg", True),
+        ("psycopg_async", True),
+    ],
+)
+def test_session_settings_pool_event(driver, listens_on_connect):
+    """
+    Verify settings are applied once per connection only for drivers with a server-side session,
+    and re-applied on each checkout for the HTTP driver.
+    """
+    engine = sa.create_engine("sqlite://")
+    engine.dialect.driver = driver
+    settings = SessionSettings()
+    enable_session_settings(engine, settings)
+    assert sa.event.contains(engine, "connect", settings.receive_connect) is listens_on_connect
+    assert sa.event.contains(engine, "checkout", settings.receive_checkout) is not listens_on_connect
@@ -0,0 +1,17 @@
+from mlflow_cratedb.adapter.setup_db import read_ddl_bundle, split_ddl
+
+
+def test_ddl_bundle_up_to_date():
+    """
+    Verify the pre-split DDL bundle matches `cratedb.sql`. Otherwise, run `poe bundle-ddl`.
+    """
+    assert read_ddl_bundle() == split_ddl("cratedb.sql")
+
+
+def test_ddl_bundle_tables():
+    """
+    Verify all statements of the DDL bundle create tables, so they can run concurrently.
+    """
+    bundle = read_ddl_bundle()
+    assert all(item["table"] and item["statement"].startswith("CREATE TABLE") for item in bundle)
+    assert len({item["table"] for item in bundle}) == len(bundle)
@@ -0,0 +1,85 @@
+import re
+
+import pytest
+import sqlalchemy as sa
+
+from mlflow_cratedb.adapter.setup_db import read_ddl, read_ddl_bundle
+from mlflow_cratedb.adapter.storage import (
+    LARGE_VALUE_COLUMNS,
+    LARGE_VALUE_OPTIONS,
+    StorageProfile,
+    StorageProfiles,
+    uri_parameters,
+)
+
+STATEMENT = 'CREATE TABLE IF NOT EXISTS "metrics" (\n\tkey TEXT NOT NULL\n);'
+
+
+def test_storage_profiles_defaults():
+    """
+    Verify built-in profiles scale shards of large tables with the cluster size.
+    """
+    profiles = StorageProfiles()
+    assert profiles.render("metrics", STATEMENT, nodes=3) == (
+        'CREATE TABLE IF NOT EXISTS "metrics" (\n\tkey TEXT NOT NULL\n) '
+        'CLUSTERED BY ("run_uuid") INTO 12 SHARDS '
+        "WITH (codec = 'best_compression');"
+    )
+    assert profiles.get("workspaces").number_of_shards(nodes=3) == 1
+    assert profiles.render("runs", "CREATE TABLE runs (id TEXT);", nodes=3) == "CREATE TABLE runs (id TEXT);"
+
+
+def test_storage_profiles_file_and_url(tmp_path):
+    """
+    Verify profiles from a file apply to all tables, and URI query parameters take precedence.
+    """
+    path = tmp_path / "profiles.yaml"
+    path.write_text('"*":\n  replicas: "1"\nmetrics:\n  refresh_interval: 5000\n  shards: 6\n')
+    url = sa.make_url(f"crate://localhost/?schema=testdrive&storage_profiles={path}&storage.metrics.shards=8")
+    profiles = StorageProfiles.from_url(url)
+    assert profiles.render("metrics", STATEMENT, nodes=1).endswith(
+        'CLUSTERED BY ("run_uuid") INTO 8 SHARDS '
+        "WITH (number_of_replicas = '1', refresh_interval = 5000, codec = 'best_compression');"
+    )
+    assert profiles.render("runs", "CREATE TABLE runs (id TEXT);", nodes=1) == (
+        "CREATE TABLE runs (id TEXT) WITH (number_of_replicas = '1');"
+    )
+    assert sorted(uri_parameters(url)) == ["storage.metrics.shards", "storage_profiles"]
+    assert profiles.fingerprint() != StorageProfiles().fingerprint()
+
+
+def test_storage_profiles_clustered_by():
+    """
+    Verify run-scoped tables are routed by `run_uuid`, with or without a number of shards.
+    """
+    profiles = StorageProfiles({"spans": StorageProfile(clustered_by="trace_id")})
+    statement = 'CREATE TABLE "params" (\n\trun_uuid TEXT,\n\tPRIMARY KEY (run_uuid)\n);'
+    assert profiles.render("params", statement, nodes=3).endswith(') CLUSTERED BY ("run_uuid");')
+    assert profiles.render("spans", "CREATE TABLE spans (trace_id TEXT);", nodes=2) == (
+        'CREATE TABLE spans (trace_id TEXT) CLUSTERED BY ("trace_id") INTO 8 SHARDS '
+        "WITH (codec = 'best_compression');"
+    )
+
+
+def test_storage_profiles_large_values():
+    """
+    Verify the opt-in large-value profile disables index and column store of all candidate columns.
+    """
+    url = sa.make_url("crate://localhost/?storage.*.large_values=true")
+    profiles = StorageProfiles.from_url(url)
+    for item in read_ddl_bundle():
+        statement = profiles.render(item["table"], item["statement"], nodes=1)
+        for column in LARGE_VALUE_COLUMNS.get(item["table"], ()):
+            assert re.search(rf"\b{column}\"? TEXT[^,]* {re.escape(LARGE_VALUE_OPTIONS)}", statement)
+        if item["table"] in ("params", "spans"):
+            assert LARGE_VALUE_OPTIONS not in statement
+    assert LARGE_VALUE_OPTIONS not in StorageProfiles().render("jobs", read_ddl("cratedb.sql"), nodes=1)
+
+
+def test_storage_profiles_invalid():
+    with pytest.raises(ValueError, match="Invalid storage setting: foo"):
+        StorageProfiles.from_url(sa.make_url("crate://localhost/?storage.metrics.foo=1"))
+    with pytest.raises(ValueError, match="Invalid storage parameter: storage.shards"):
+        StorageProfiles.from_url(sa.make_url("crate://localhost/?storage.shards=1"))
+    with pytest.raises(ValueError, match="Invalid boolean value: maybe"):
+        StorageProfiles.from_url(sa.make_url("crate://localhost/?storage.*.large_values=maybe"))
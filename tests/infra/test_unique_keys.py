@@ -0,0 +1,37 @@
+import pytest
+from mlflow.store.tracking.dbmodels.models import SqlEvaluationDatasetRecord
+from sqlalchemy_cratedb.dialect import CrateDialect
+
+from mlflow_cratedb.adapter.unique_keys import UniquenessMode, unique_key
+from mlflow_cratedb.patch.mlflow.model import uniqueness_query
+
+
+def test_uniqueness_mode():
+    assert UniquenessMode.parse("Shadow-Keys") is UniquenessMode.SHADOW_KEYS
+    with pytest.raises(ValueError, match="Invalid uniqueness mode: foo. Use one of: query, shadow-keys"):
+        UniquenessMode.parse("foo")
+
+
+def test_unique_key():
+    """
+    Verify shadow keys are stable, and distinguish tables, constraints, and values.
+    """
+    key = unique_key("experiments", "workspace-name", ("default", "foo"))
+    assert key == unique_key("experiments", "workspace-name", ["default", "foo"])
+    assert key != unique_key("experiments", "workspace-name", ("default", "bar"))
+    assert key != unique_key("registered_models", "workspace-name", ("default", "foo"))
+    assert len(key) == 64
+
+
+def test_uniqueness_query():
+    """
+    Verify value combinations are grouped by all but the last column, because CrateDB
+    does not support row value comparisons.
+    """
+    stmt = uniqueness_query(
+        SqlEvaluationDatasetRecord, ("dataset_id", "input_hash"), [("d1", "h1"), ("d1", "h2"), ("d2", None)]
+    )
+    sql = str(stmt.compile(dialect=CrateDialect(), compile_kwargs={"literal_binds": True}))
+    sql = sql.replace("evaluation_dataset_records.", "")
+    assert "dataset_id = 'd1' AND input_hash IN ('h1', 'h2')" in sql
+    assert "dataset_id = 'd2' AND input_hash IS NULL" in sql
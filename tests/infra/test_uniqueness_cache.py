@@ -0,0 +1,56 @@
+from unittest import mock
+
+from mlflow_cratedb.adapter.uniqueness_cache import UniquenessCache
+
+DATABASE = "crate://crate@localhost/?schema=testdrive"
+
+
+def test_uniqueness_cache_lru():
+    """
+    Verify the least recently used entries are evicted first.
+    """
+    cache = UniquenessCache(maxsize=2)
+    cache.add(DATABASE, "experiments", "workspace-name", ("default", "foo"))
+    cache.add(DATABASE, "experiments", "workspace-name", ("default", "bar"))
+    assert cache.contains(DATABASE, "experiments", "workspace-name", ("default", "foo")) is True
+    cache.add(DATABASE, "experiments", "workspace-name", ("default", "baz"))
+    assert cache.contains(DATABASE, "experiments", "workspace-name", ("default", "bar")) is False
+    assert cache.contains(DATABASE, "experiments", "workspace-name", ("default", "foo")) is True
+    assert not cache.contains("crate://localhost/?schema=other", "experiments", "workspace-name", ("default", "foo"))
+
+
+def test_uniqueness_cache_discard():
+    """
+    Verify deleted value combinations are forgotten, instead of being remembered as absent.
+    """
+    cache = UniquenessCache()
+    cache.add(DATABASE, "users", "username", ("foo",))
+    cache.discard(DATABASE, "users", "username", ("foo",))
+    cache.discard(DATABASE, "users", "username", ("bar",))
+    assert cache.contains(DATABASE, "users", "username", ("foo",)) is False
+    assert cache._entries == {}
+
+
+def test_uniqueness_cache_expiry():
+    cache = UniquenessCache(ttl_ms=1000)
+    with mock.patch("time.monotonic", return_value=100.0):
+        cache.add(DATABASE, "users", "username", ("foo",))
+    with mock.patch("time.monotonic", return_value=100.5):
+        assert cache.contains(DATABASE, "users", "username", ("foo",)) is True
+    with mock.patch("time.monotonic", return_value=101.5):
+        assert cache.contains(DATABASE, "users", "username", ("foo",)) is False
+
+
+def test_uniqueness_cache_invalidate():
+    cache = UniquenessCache()
+    cache.add(DATABASE, "users", "username", ("foo",))
+    cache.add(DATABASE, "registered_models", "name", ("foo",))
+    cache.invalidate("users")
+    assert cache.contains(DATABASE, "users", "username", ("foo",)) is False
+    assert cache.contains(DATABASE, "registered_models", "name", ("foo",)) is True
+
+
+def test_uniqueness_cache_disabled():
+    cache = UniquenessCache(maxsize=0)
+    cache.add(DATABASE, "users", "username", ("foo",))
+    assert cache.contains(DATABASE, "users", "username", ("foo",)) is False
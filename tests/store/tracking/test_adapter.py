@@ -1,10 +1,33 @@
+import asyncio
+import datetime as dt
+import json
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Generator, List
+from unittest import mock
+
 import pytest
 import sqlalchemy as sa
+from mlflow.entities import Dataset, DatasetInput, ExperimentTag, InputTag, Metric, Param, ViewType
+from mlflow.exceptions import MlflowException
 from mlflow.store.tracking.dbmodels.initial_models import Base
 from mlflow.store.tracking.dbmodels.models import SqlExperiment
 from mlflow.store.tracking.sqlalchemy_store import SqlAlchemyStore
 
-from mlflow_cratedb.adapter.setup_db import _setup_db_create_tables, _setup_db_drop_tables
+from mlflow_cratedb.adapter.instrumentation import instrumentation
+from mlflow_cratedb.adapter.migration import existing_columns, migrate_schema
+from mlflow_cratedb.adapter.purge import purge_experiments, truncate_tables
+from mlflow_cratedb.adapter.refresh import get_refresh_policy, refresh_statement
+from mlflow_cratedb.adapter.retention import drop_partitions
+from mlflow_cratedb.adapter.setup_db import (
+    METADATA_TABLE,
+    _get_metadata,
+    _set_metadata,
+    _setup_db_create_tables,
+    _setup_db_drop_tables,
+    read_ddl_bundle,
+)
+from mlflow_cratedb.adapter.storage import StorageProfile, StorageProfiles
 
 
 @pytest.fixture
@@ -42,6 +65,27 @@ def test_setup_tables(engine: sa.Engine):
         assert result.rowcount == 0
 
 
+def test_setup_tables_fingerprint(engine: sa.Engine):
+    """
+    Verify provisioning is skipped when the fingerprint of the DDL matches the recorded one.
+    """
+    _setup_db_drop_tables(engine=engine)
+    _setup_db_create_tables(engine=engine)
+
+    statements: List[str] = []
+
+    def receive_before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sa.event.listen(engine, "before_cursor_execute", receive_before_cursor_execute)
+    try:
+        _setup_db_create_tables(engine=engine)
+    finally:
+        sa.event.remove(engine, "before_cursor_execute", receive_before_cursor_execute)
+    assert not any(statement.startswith("CREATE TABLE") for statement in statements)
+    assert len(statements) == 1
+
+
 def test_query_model(store: SqlAlchemyStore):
     """
     Verify setting up MLflow database tables works well.
@@ -59,3 +103,423 @@ def test_query_model(store: SqlAlchemyStore):
         # This makes sure the designated schema is properly used through `search_path`.
         record = session.execute(sa.text("SELECT * FROM testdrive.experiments;")).mappings().one()
         assert record["name"] == "Default"
+
+
+def test_session_settings_after_reconnect(engine: sa.Engine):
+    """
+    Verify session settings still hold after the HTTP driver replaced its keep-alive sockets.
+    """
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("SHOW search_path").scalar() == "testdrive, pg_catalog"
+        client = connection.connection.dbapi_connection.client
+        for server in client.server_pool.values():
+            server.pool.clear()
+
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("SHOW search_path").scalar() == "testdrive, pg_catalog"
+        assert connection.exec_driver_sql("SHOW error_on_unknown_object_key").scalar() == "false"
+
+
+@contextmanager
+def capture_refresh() -> Generator[List[str], Any, None]:
+    """
+    Record all `REFRESH TABLE` statements emitted by the adapter.
+
+    The `on-read` consistency mode invokes them on the DBAPI cursor within a
+    `before_cursor_execute` event, so SQLAlchemy event listeners do not see them.
+    """
+    statements: List[str] = []
+
+    def record(tables):
+        statement = refresh_statement(tables)
+        statements.append(statement)
+        return statement
+
+    with mock.patch("mlflow_cratedb.adapter.refresh.refresh_statement", record):
+        yield statements
+
+
+def test_refresh_coalesced_per_flush(store: SqlAlchemyStore):
+    """
+    Verify `REFRESH TABLE` is emitted once per flush, not once per inserted row.
+    """
+    experiment_id = store.create_experiment("refresh-coalesce")
+    run = store.create_run(experiment_id, user_id="user", start_time=0, tags=[], run_name="run")
+    metrics = [Metric(key=f"metric-{i}", value=float(i), timestamp=0, step=0) for i in range(25)]
+
+    with capture_refresh() as statements:
+        store.log_batch(run.info.run_id, metrics=metrics, params=[], tags=[])
+
+    assert 0 < len(statements) < len(metrics)
+    assert any("metrics" in statement for statement in statements)
+    assert len(store.get_metric_history(run.info.run_id, "metric-0")) == 1
+
+
+@pytest.mark.parametrize("consistency", ["per-commit", "none"])
+def test_refresh_consistency_mode(db_uri: str, artifact_uri: str, reset_database, consistency: str):
+    """
+    Verify the `consistency` URI query parameter selects the refresh behaviour per engine.
+    """
+    store = SqlAlchemyStore(f"{db_uri}&consistency={consistency}", artifact_uri)
+    assert get_refresh_policy(store.engine).mode == consistency
+    assert "consistency" not in store.engine.url.query
+
+    experiment_id = store.create_experiment(f"refresh-{consistency}")
+    with capture_refresh() as statements:
+        store.set_experiment_tag(experiment_id, ExperimentTag("foo", "bar"))
+
+    if consistency == "none":
+        assert statements == []
+    else:
+        assert statements == ["REFRESH TABLE experiment_tags"]
+
+
+def test_refresh_on_read(db_uri: str, artifact_uri: str, reset_database):
+    """
+    Verify the `on-read` consistency mode defers `REFRESH TABLE` until a modified table is read.
+    """
+    store = SqlAlchemyStore(f"{db_uri}&consistency=on-read", artifact_uri)
+    experiment_id = store.create_experiment("refresh-on-read")
+    run = store.create_run(experiment_id, user_id="user", start_time=0, tags=[], run_name="run")
+    metrics = [Metric(key="metric", value=float(i), timestamp=i, step=i) for i in range(10)]
+
+    with capture_refresh() as statements:
+        store.log_batch(run.info.run_id, metrics=metrics, params=[], tags=[])
+    assert not any("metrics" in statement for statement in statements)
+
+    with capture_refresh() as statements:
+        assert len(store.get_metric_history(run.info.run_id, "metric")) == 10
+        assert len(store.get_metric_history(run.info.run_id, "metric")) == 10
+    assert statements == ["REFRESH TABLE metrics"]
+
+
+def test_refresh_on_read_primary_key_lookup(db_uri: str, artifact_uri: str, reset_database):
+    """
+    Verify lookups by primary key do not refresh tables, because CrateDB serves them in real time.
+    """
+    store = SqlAlchemyStore(f"{db_uri}&consistency=on-read", artifact_uri)
+    experiment_id = store.create_experiment("refresh-primary-key")
+    run = store.create_run(experiment_id, user_id="user", start_time=0, tags=[], run_name="run")
+
+    def refreshed_tables(statements: List[str]) -> List[str]:
+        return [table for statement in statements for table in statement.replace("REFRESH TABLE ", "").split(", ")]
+
+    with capture_refresh() as statements:
+        assert store.get_experiment(experiment_id).name == "refresh-primary-key"
+        assert store.get_run(run.info.run_id).info.run_name == "run"
+    assert "experiments" not in refreshed_tables(statements)
+    assert "runs" not in refreshed_tables(statements)
+
+    # A scan of the `runs` table still needs to see the most recent writes.
+    instrumentation.reset()
+    with capture_refresh() as statements:
+        assert len(store.search_runs([experiment_id], filter_string="", run_view_type=ViewType.ALL)) == 1
+    assert "runs" in refreshed_tables(statements)
+    assert instrumentation.snapshot()["refresh"]["runs"]["count"] == 1
+
+
+def test_uniqueness_check_batched(store: SqlAlchemyStore):
+    """
+    Verify rows pending within a flush are validated using a single uniqueness check query.
+    """
+    instrumentation.reset()
+    with store.ManagedSessionMaker() as session:
+        session.add_all(
+            [SqlExperiment(name=f"unique-{i}", workspace="default", artifact_location="file:///tmp") for i in range(5)]
+        )
+        session.flush()
+    assert instrumentation.snapshot()["uniqueness_check"]["experiments"]["count"] == 1
+
+    with pytest.raises(MlflowException, match="DuplicateKeyException in table 'experiments'"):
+        with store.ManagedSessionMaker() as session:
+            session.add(SqlExperiment(name="unique-4", workspace="default", artifact_location="file:///tmp"))
+            session.flush()
+
+
+def test_uniqueness_check_within_batch(store: SqlAlchemyStore):
+    """
+    Verify duplicates within the rows pending within a flush are detected.
+    """
+    with pytest.raises(MlflowException, match="DuplicateKeyException in table 'experiments'"):
+        with store.ManagedSessionMaker() as session:
+            session.add_all(
+                [SqlExperiment(name="unique", workspace="default", artifact_location="file:///tmp") for _ in range(2)]
+            )
+            session.flush()
+
+
+def test_uniqueness_shadow_keys(store: SqlAlchemyStore, monkeypatch):
+    """
+    Verify the `shadow-keys` uniqueness mode rejects duplicates, and releases keys of renamed rows.
+    """
+    monkeypatch.setenv("MLFLOW_CRATEDB_UNIQUENESS", "shadow-keys")
+    experiment_id = store.create_experiment("shadow")
+    with pytest.raises(MlflowException, match="DuplicateKeyException in table 'experiments'"):
+        store.create_experiment("shadow")
+
+    store.rename_experiment(experiment_id, "shadow-renamed")
+    assert store.create_experiment("shadow") != experiment_id
+    with pytest.raises(MlflowException, match="DuplicateKeyException in table 'experiments'"):
+        store.create_experiment("shadow-renamed")
+
+
+def test_uniqueness_cache(store: SqlAlchemyStore):
+    """
+    Verify existing names are rejected without a database round trip, and accepted again after renaming.
+    """
+    experiment_id = store.create_experiment("cached")
+    instrumentation.reset()
+    for _ in range(3):
+        with pytest.raises(MlflowException, match="DuplicateKeyException in table 'experiments'"):
+            store.create_experiment("cached")
+    assert "uniqueness_check" not in instrumentation.snapshot()
+
+    # Names not known to exist are always verified against the database.
+    store.rename_experiment(experiment_id, "cached-renamed")
+    instrumentation.reset()
+    assert store.create_experiment("cached") != experiment_id
+    assert instrumentation.snapshot()["uniqueness_check"]["experiments"]["count"] == 1
+
+
+def test_retention_drop_partitions(engine: sa.Engine):
+    """
+    Verify retention drops partitions of the `metrics` table which only contain expired rows.
+    """
+    statement = next(item["statement"] for item in read_ddl_bundle() if item["table"] == "metrics")
+    statement = StorageProfiles({"metrics": StorageProfile(partition_by="month")}).render("metrics", statement, nodes=1)
+    statement = statement.replace('"metrics"', '"metrics_retention"')
+    timestamps = [dt.datetime(2020, 1, 15, tzinfo=dt.timezone.utc), dt.datetime(2020, 3, 15, tzinfo=dt.timezone.utc)]
+    with engine.connect() as connection:
+        connection.execute(sa.text('DROP TABLE IF EXISTS "metrics_retention"'))
+        connection.execute(sa.text(statement))
+        for timestamp in timestamps:
+            connection.execute(
+                sa.text(
+                    'INSERT INTO "metrics_retention" (key, value, timestamp, step, is_nan, run_uuid) '
+                    "VALUES ('foo', 1.0, :timestamp, 0, false, 'run')"
+                ),
+                {"timestamp": int(timestamp.timestamp() * 1000)},
+            )
+        connection.execute(sa.text('REFRESH TABLE "metrics_retention"'))
+        connection.commit()
+
+    try:
+        assert drop_partitions(engine, "metrics_retention", dt.datetime(2020, 3, 20, tzinfo=dt.timezone.utc)) == 1
+        with engine.connect() as connection:
+            connection.execute(sa.text('REFRESH TABLE "metrics_retention"'))
+            assert connection.execute(sa.text('SELECT COUNT(*) FROM "metrics_retention"')).scalar() == 1
+    finally:
+        with engine.connect() as connection:
+            connection.execute(sa.text('DROP TABLE IF EXISTS "metrics_retention"'))
+            connection.commit()
+
+
+def test_migrate_schema_add_column(engine: sa.Engine):
+    """
+    Verify the schema migration adds columns missing from existing tables, and records the schema version.
+    """
+    with engine.connect() as connection:
+        connection.execute(sa.text('DROP TABLE IF EXISTS "jobs_migration"'))
+        connection.execute(sa.text('CREATE TABLE "jobs_migration" (id TEXT NOT NULL, PRIMARY KEY (id))'))
+        connection.commit()
+
+    statement = 'CREATE TABLE "jobs_migration" (id TEXT NOT NULL, result TEXT, PRIMARY KEY (id))'
+    try:
+        assert migrate_schema(engine, {"jobs_migration": statement}) == [
+            'ALTER TABLE "jobs_migration" ADD COLUMN result TEXT'
+        ]
+        assert migrate_schema(engine, {"jobs_migration": statement}) == []
+        with engine.connect() as connection:
+            assert "result" in existing_columns(connection)["jobs_migration"]
+            assert _get_metadata(connection, "schema_version")
+    finally:
+        with engine.connect() as connection:
+            connection.execute(sa.text('DROP TABLE IF EXISTS "jobs_migration"'))
+            connection.commit()
+
+
+def test_migrate_schema_concurrent(engine: sa.Engine):
+    """
+    Verify concurrent schema migrations both succeed, and add the missing column once.
+    """
+    with engine.connect() as connection:
+        connection.execute(sa.text('DROP TABLE IF EXISTS "jobs_migration"'))
+        connection.execute(sa.text('CREATE TABLE "jobs_migration" (id TEXT NOT NULL, PRIMARY KEY (id))'))
+        connection.commit()
+
+    statement = 'CREATE TABLE "jobs_migration" (id TEXT NOT NULL, result TEXT, PRIMARY KEY (id))'
+    alteration = 'ALTER TABLE "jobs_migration" ADD COLUMN result TEXT'
+    try:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(migrate_schema, engine, {"jobs_migration": statement}) for _ in range(2)]
+            outcomes = [future.result() for future in futures]
+        assert alteration in outcomes[0] + outcomes[1]
+        assert all(outcome in ([], [alteration]) for outcome in outcomes)
+        with engine.connect() as connection:
+            assert "result" in existing_columns(connection)["jobs_migration"]
+    finally:
+        with engine.connect() as connection:
+            connection.execute(sa.text('DROP TABLE IF EXISTS "jobs_migration"'))
+            connection.commit()
+
+
+def test_psycopg_store(artifact_uri: str):
+    """
+    Verify the tracking store works with the `crate+psycopg://` dialect, including reflection.
+    """
+    pytest.importorskip("psycopg")
+
+    store = SqlAlchemyStore("crate+psycopg://crate@localhost:5432/?schema=testdrive", artifact_uri)
+    assert sa.inspect(store.engine).has_table("runs")
+    assert "run_uuid" in {column["name"] for column in sa.inspect(store.engine).get_columns("runs")}
+
+    experiment_id = store.create_experiment("psycopg-foo")
+    run = store.create_run(experiment_id, user_id="user", start_time=0, tags=[], run_name="run")
+    store.log_batch(run.info.run_id, metrics=[Metric("loss", 1.0, 0, 0)], params=[Param("lr", "0.1")], tags=[])
+    runs = store.search_runs([experiment_id], "params.lr = '0.1'", ViewType.ALL)
+    assert [item.info.run_id for item in runs] == [run.info.run_id]
+    assert store.get_run(run.info.run_id).data.metrics == {"loss": 1.0}
+
+
+async def asgi_request(app, method: str, path: str, body: Any = None) -> Any:
+    """
+    Invoke an ASGI application, and return the status code and the decoded JSON response.
+    """
+    path, _, query = path.partition("?")
+    payload = json.dumps(body).encode() if body is not None else b""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [
+            (b"host", b"localhost"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(payload)).encode()),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("localhost", 5000),
+    }
+    await app(scope, receive, send)
+    status = next(message["status"] for message in messages if message["type"] == "http.response.start")
+    response = b"".join(message.get("body", b"") for message in messages if message["type"] == "http.response.body")
+    return status, json.loads(response)
+
+
+def test_async_server(monkeypatch, artifact_uri: str):
+    """
+    Verify the FastAPI application serves the endpoints of logging clients natively, using `crate+psycopg://`.
+    """
+    pytest.importorskip("psycopg")
+    import mlflow.server.handlers as handlers
+    from mlflow.server import ARTIFACT_ROOT_ENV_VAR, BACKEND_STORE_URI_ENV_VAR
+    from mlflow.server.fastapi_app import create_fastapi_app
+
+    import mlflow_cratedb.patch.mlflow.fastapi_app as fastapi_app
+
+    monkeypatch.setenv(BACKEND_STORE_URI_ENV_VAR, "crate+psycopg://crate@localhost:5432/?schema=testdrive")
+    monkeypatch.setenv(ARTIFACT_ROOT_ENV_VAR, artifact_uri)
+    monkeypatch.setattr(handlers, "_tracking_store", None)
+    monkeypatch.setattr(fastapi_app, "_async_store", None)
+    app = create_fastapi_app()
+    fastapi_app.register_async_routes(app)
+    assert isinstance(app.router.routes[0], fastapi_app._AsyncRoute)
+
+    async def scenario():
+        status, response = await asgi_request(app, "POST", "/api/2.0/mlflow/experiments/create", {"name": "async"})
+        assert status == 200
+        experiment_id = response["experiment_id"]
+        status, response = await asgi_request(
+            app, "POST", "/api/2.0/mlflow/runs/create", {"experiment_id": experiment_id, "start_time": 0}
+        )
+        assert status == 200
+        run_id = response["run"]["info"]["run_id"]
+
+        batch = {
+            "run_id": run_id,
+            "metrics": [{"key": "loss", "value": 1.0, "timestamp": 0, "step": 0}],
+            "params": [{"key": "lr", "value": "0.1"}],
+        }
+        assert await asgi_request(app, "POST", "/api/2.0/mlflow/runs/log-batch", batch) == (200, {})
+        status, response = await asgi_request(app, "GET", f"/api/2.0/mlflow/runs/get?run_id={run_id}")
+        assert status == 200
+        assert response["run"]["data"]["metrics"][0]["key"] == "loss"
+        search = {"experiment_ids": [experiment_id], "filter": "params.lr = '0.1'"}
+        status, response = await asgi_request(app, "POST", "/api/2.0/mlflow/runs/search", search)
+        assert status == 200
+        assert [run["info"]["run_id"] for run in response["runs"]] == [run_id]
+        status, response = await asgi_request(app, "POST", "/api/2.0/mlflow/runs/log-batch", {"metrics": []})
+        assert status == 400
+        assert response["error_code"] == "INVALID_PARAMETER_VALUE"
+
+    asyncio.run(scenario())
+
+
+def test_purge_experiments(store: SqlAlchemyStore):
+    """
+    Verify purging an experiment deletes its runs, metrics, and dataset inputs, and leaves
+    other experiments alone.
+    """
+    experiment_ids = [store.create_experiment(name) for name in ("purge-foo", "purge-bar")]
+    run_ids = []
+    for experiment_id in experiment_ids:
+        run = store.create_run(experiment_id, user_id="user", start_time=0, tags=[], run_name="run")
+        store.log_metric(run.info.run_id, Metric("loss", 1.0, 0, 0))
+        dataset = Dataset(name="data", digest="digest", source_type="local", source="file:///tmp/data")
+        store.log_inputs(
+            run.info.run_id, datasets=[DatasetInput(dataset=dataset, tags=[InputTag(key="context", value="train")])]
+        )
+        run_ids.append(run.info.run_id)
+
+    outcome = purge_experiments(store.engine, experiment_ids=[int(experiment_ids[0])])
+    assert outcome["experiments"] == 1
+    assert outcome["runs"] == 1
+    assert outcome["metrics"] == 1
+    assert outcome["inputs"] == 1
+    assert outcome["input_tags"] == 1
+
+    with store.engine.connect() as connection:
+        result = connection.execute(sa.text("SELECT run_uuid FROM runs WHERE run_uuid = ANY(:ids)"), {"ids": run_ids})
+        assert result.scalars().all() == [run_ids[1]]
+        inputs = connection.execute(sa.text("SELECT input_uuid, destination_id FROM inputs")).all()
+        assert [destination_id for _, destination_id in inputs] == [run_ids[1]]
+        result = connection.execute(sa.text("SELECT input_uuid FROM input_tags"))
+        assert result.scalars().all() == [inputs[0][0]]
+
+
+def test_truncate_tables_skips_empty(engine: sa.Engine):
+    """
+    Verify truncating only deletes from tables holding data.
+    """
+    truncate_tables(engine)
+    assert truncate_tables(engine) == {}
+
+
+def test_truncate_tables_bookkeeping(store: SqlAlchemyStore):
+    """
+    Verify truncating keeps the metadata table, and releases the shadow keys of deleted rows.
+    """
+    store.create_experiment("truncate-foo")
+    with store.engine.connect() as connection:
+        _set_metadata(connection, "truncate", "foo")
+        connection.commit()
+
+    outcome = truncate_tables(store.engine)
+    assert "experiments" in outcome
+    assert METADATA_TABLE not in outcome
+    with store.engine.connect() as connection:
+        assert _get_metadata(connection, "truncate") == "foo"
+    store.create_experiment("truncate-foo")
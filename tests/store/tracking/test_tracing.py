@@ -1,6 +1,7 @@
 import json
 from unittest import mock
 
+import sqlalchemy as sa
 from mlflow.entities import TraceInfo, TraceLocation, TraceState
 from mlflow.entities.span import Span, create_mlflow_span
 from mlflow.entities.trace_metrics import AggregationType, MetricAggregation, MetricDataPoint, MetricViewType
@@ -166,3 +167,30 @@ def test_query_trace_metrics_percentile(db_uri):
             max_results=20,
         )
         assert results == []
+
+
+def test_trace_timestamp_updates_partitioned(artifact_uri):
+    """
+    Verify logging spans, and starting the same trace again, update `trace_info.timestamp_ms`,
+    when the tables which can be partitioned are partitioned.
+    """
+    from mlflow_cratedb.adapter.setup_db import _setup_db_drop_tables
+
+    store = SqlAlchemyStore(
+        "crate://crate@localhost/?schema=testdrive_partitioned"
+        "&storage.metrics.partition_by=day&storage.spans.partition_by=day",
+        artifact_uri,
+    )
+    try:
+        trace_id = "tr-partitioned"
+        _create_trace(store, trace_id, request_time=5_000)
+        store.log_spans("0", [create_test_span(trace_id, start_ns=1_000_000_000, end_ns=2_000_000_000)])
+        _create_trace(store, trace_id, request_time=500)
+        assert store.get_trace_info(trace_id).trace_id == trace_id
+        with store.engine.connect() as connection:
+            count = connection.execute(
+                sa.text("SELECT COUNT(*) FROM trace_info WHERE request_id = :trace_id"), {"trace_id": trace_id}
+            ).scalar()
+        assert count == 1
+    finally:
+        _setup_db_drop_tables(store.engine)